@@ -0,0 +1,360 @@
+'''Benchmarks for the map generation, rendering and game logic code.
+
+Run all of them with:   python benchmark.py
+or just some with:      python benchmark.py rooms
+
+They run headless (see constants.HEADLESS), so no window is opened.
+'''
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("GAME_HEADLESS", "1")
+
+import numpy as np
+import pygame
+import tcod as libtcodpy
+
+import constants
+import main
+
+
+##############################################################################
+# MAP
+##############################################################################
+
+
+def bench_rooms():
+    ''' Room placement on a 1000x1000 map with 5,000 room attempts '''
+    width, height, num_rooms = 1000, 1000, 5000
+
+    start = time.perf_counter()
+    new_map, list_of_rooms = main.map_create(
+        seed=1, width=width, height=height, num_rooms=num_rooms)
+    grid_time = time.perf_counter() - start
+
+    print("map_create {}x{}, {} attempts: {:.3f}s".format(
+        width, height, num_rooms, grid_time))
+    print("  placed {}, rejected {} ({:.1%})".format(
+        len(list_of_rooms), new_map.room_rejections,
+        new_map.room_rejections / new_map.room_attempts))
+
+    # The same candidates checked pairwise with obj_Room.intersect
+    rng = libtcodpy.random_new_from_seed(1)
+    pairwise_rooms = []
+
+    start = time.perf_counter()
+    for i in range(num_rooms):
+        w = libtcodpy.random_get_int(
+            rng, constants.ROOM_MIN_WIDTH, constants.ROOM_MAX_WIDTH)
+        h = libtcodpy.random_get_int(
+            rng, constants.ROOM_MIN_HEIGHT, constants.ROOM_MAX_HEIGHT)
+        x = libtcodpy.random_get_int(rng, 2, width - w - 2)
+        y = libtcodpy.random_get_int(rng, 2, height - h - 2)
+
+        new_room = main.obj_Room((x, y), (w, h))
+
+        if not any(new_room.intersect(other) for other in pairwise_rooms):
+            if pairwise_rooms:
+                # Keep the generator in step with map_create_tunnels
+                libtcodpy.random_get_int(rng, 0, 1)
+            pairwise_rooms.append(new_room)
+    pairwise_time = time.perf_counter() - start
+
+    print("pairwise intersect checks only: {:.3f}s ({} placed)".format(
+        pairwise_time, len(pairwise_rooms)))
+
+
+##############################################################################
+# DRAW
+##############################################################################
+
+
+def bench_blits():
+    ''' Frame time of one blit per sprite vs a render queue, which uses the
+    atlas at the larger size only '''
+    main.game_initialize()
+    assets = main.ASSETS
+
+    tile_sprites = [assets.S_WALL, assets.S_FLOOR,
+                    assets.S_WALLEXPLORED, assets.S_FLOOREXPLORED]
+    actor_sprites = [sprite for animation in assets.animation_dict.values()
+                     for sprite in animation]
+
+    for cols, rows, frames in ((25, 19, 500), (100, 75, 50)):
+        surface = pygame.Surface((cols * constants.CELL_WIDTH,
+                                  rows * constants.CELL_HEIGHT))
+
+        rng = random.Random(1)
+        cells = [((x * constants.CELL_WIDTH, y * constants.CELL_HEIGHT),
+                  rng.choice(tile_sprites))
+                 for x in range(cols) for y in range(rows)]
+
+        # An actor on one cell in twenty, drawn over the tiles
+        blits = cells + [(dest, rng.choice(actor_sprites))
+                         for dest, _ in rng.sample(cells, len(cells) // 20)]
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            for dest, sprite in blits:
+                surface.blit(sprite, dest)
+        blit_time = (time.perf_counter() - start) / frames
+
+        queue = main.obj_RenderQueue(assets.atlas, cols * rows)
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            for dest, sprite in blits:
+                queue.add(sprite, dest)
+            queue.draw(surface)
+        queue_time = (time.perf_counter() - start) / frames
+
+        print("{}x{} cells, {} blits: blit {:.3f}ms, queue {:.3f}ms per frame".format(
+            cols, rows, len(blits), blit_time * 1000, queue_time * 1000))
+
+    main.LEVEL_PREFETCHER.shutdown()
+
+
+##############################################################################
+# GAME
+##############################################################################
+
+
+def bench_turns():
+    ''' Game logic only: 20,000 turns of random keys, nothing drawn '''
+    main.game_headless(num_turns=20000, seed=1)
+
+
+def bench_moves():
+    ''' Time per creature move on a level with 10 vs 10,000 mice '''
+    main.game_initialize()
+    main.RANDOM_ENGINE = random.Random(1)
+    main.game_new()
+
+    # Room enough that the mice seldom bump into each other
+    main.GAME.current_map, _ = main.map_create(
+        seed=1, width=400, height=400, num_rooms=2000)
+
+    level = main.GAME.current_objects
+    floor_x, floor_y = (~main.GAME.current_map.block_path).nonzero()
+    floor = list(zip(floor_x.tolist(), floor_y.tolist()))
+
+    for num_mice, num_moves in ((10, 100000), (10000, 100000)):
+        level.clear()
+        level.append(main.PLAYER)
+
+        rng = random.Random(1)
+        mice = [main.gen_mouse(rng.choice(floor)) for _ in range(num_mice)]
+        level.extend(mice)
+
+        steps = [(rng.choice(mice).creature,
+                  rng.choice([(0, 1), (0, -1), (1, 0), (-1, 0)]))
+                 for _ in range(num_moves)]
+
+        start = time.perf_counter()
+        for creature, (dx, dy) in steps:
+            creature.move(dx, dy)
+        move_time = (time.perf_counter() - start) / num_moves
+
+        print("{} mice: {:.2f}us per move".format(
+            num_mice, move_time * 1000000))
+
+    main.LEVEL_PREFETCHER.shutdown()
+
+
+def bench_frames():
+    ''' Game logic of frames without a key pressed, on a level with 10 vs
+    10,000 scrolls lying about '''
+    main.game_initialize()
+    main.RANDOM_ENGINE = random.Random(1)
+    main.game_new()
+
+    level = main.GAME.current_objects
+    spawned = list(level)
+
+    floor_x, floor_y = (~main.GAME.current_map.block_path).nonzero()
+    floor = list(zip(floor_x.tolist(), floor_y.tolist()))
+
+    for num_scrolls, num_frames in ((10, 20000), (10000, 20000)):
+        level.clear()
+        level.extend(spawned)
+
+        rng = random.Random(1)
+        level.extend(main.gen_scroll_lightning(rng.choice(floor))
+                     for _ in range(num_scrolls))
+
+        start = time.perf_counter()
+        main.game_main_loop([] for _ in range(num_frames))
+        frame_time = (time.perf_counter() - start) / num_frames
+
+        print("{} scrolls: {:.2f}us per frame".format(
+            num_scrolls, frame_time * 1000000))
+
+    main.LEVEL_PREFETCHER.shutdown()
+
+
+def bench_combat():
+    ''' Time per attack by a player carrying 0 vs 1,000 items, a tenth of
+    them equipped '''
+    main.game_initialize()
+    main.RANDOM_ENGINE = random.Random(1)
+    main.game_new()
+
+    player = main.PLAYER
+    target = main.gen_aquatic_lobster((player.x, player.y))
+    target.creature.death_function = None
+
+    for num_items, num_attacks in ((0, 20000), (1000, 20000)):
+        player.container.inventory.clear()
+
+        for i in range(num_items):
+            item = main.gen_armor_shield((player.x, player.y))
+            main.GAME.current_objects.append(item)
+            item.item.pick_up(player)
+
+            if i % 10 == 0:
+                item.equipment.equipped = True
+
+        player.container.changed()
+
+        start = time.perf_counter()
+        for _ in range(num_attacks):
+            player.creature.attack(target)
+        attack_time = (time.perf_counter() - start) / num_attacks
+
+        print("{} items: {:.2f}us per attack, power {}, defense {}".format(
+            num_items, attack_time * 1000000, player.creature.power,
+            player.creature.defense))
+
+        main.GAME.message_history.clear()
+
+    main.LEVEL_PREFETCHER.shutdown()
+
+
+def bench_entities():
+    ''' Memory per lobster as an obj_Actor vs in a struc_EntityStore, and
+    finding the ones in view by scanning vs over the store's arrays '''
+    main.game_initialize()
+    num_entities = 100000
+
+    rng = random.Random(1)
+    coords = [(rng.randrange(1000), rng.randrange(1000))
+              for _ in range(num_entities)]
+
+    tracemalloc.start()
+
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    actors = [main.gen_aquatic_lobster(xy) for xy in coords]
+    actor_bytes = (tracemalloc.get_traced_memory()[0] - start_bytes) / num_entities
+
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    store = main.struc_EntityStore()
+    for xy in coords:
+        store.add(main.gen_aquatic_lobster(xy))
+    store_bytes = (tracemalloc.get_traced_memory()[0] - start_bytes) / num_entities
+
+    tracemalloc.stop()
+
+    print("{} lobsters: obj_Actor {:.0f} bytes each, store {:.0f} bytes each".format(
+        num_entities, actor_bytes, store_bytes))
+
+    # A 41x41 view with every other tile visible
+    x1, y1, x2, y2 = 480, 480, 521, 521
+    visible = np.zeros((x2 - x1, y2 - y1), dtype=np.bool_)
+    visible[::2] = True
+
+    start = time.perf_counter()
+    in_view = [actor for actor in actors
+               if x1 <= actor.x < x2 and y1 <= actor.y < y2 and visible[actor.x - x1, actor.y - y1]]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = store.rows_in_view(x1, y1, x2, y2, visible)
+    array_time = time.perf_counter() - start
+
+    print("{} in view: scan {:.2f}ms, arrays {:.2f}ms".format(
+        len(rows), scan_time * 1000, array_time * 1000))
+
+    assert len(in_view) == len(rows)
+
+    main.LEVEL_PREFETCHER.shutdown()
+
+
+# The classes that declare __slots__ instead of keeping a __dict__ each
+SLOTTED_CLASSES = ("obj_Actor", "com_Creature", "com_Container", "com_Item",
+                   "com_Equipment", "com_Stairs", "com_ExitPortal", "ai_Confuse",
+                   "ai_Chase", "ai_Flee", "struc_Tile")
+
+
+def unslotted(cls):
+    ''' A copy of a slotted class that keeps its fields in a __dict__.
+    A plain subclass isn't enough: its fields would still go in the slots '''
+    namespace = {name: value for name, value in vars(cls).items()
+                 if name not in cls.__slots__ and name != "__slots__"}
+
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+def bench_memory():
+    ''' Bytes per actor and per tile view, 100,000 of each, with the
+    classes as they are and with unslotted copies of them '''
+    main.game_initialize()
+    num_objects = 100000
+
+    tile_map = main.struc_Map(1000, 1000)
+
+    kinds = (("lobster", lambda i: main.gen_aquatic_lobster((i % 1000, i // 1000))),
+             ("sword", lambda i: main.gen_weapon_sword((i % 1000, i // 1000))),
+             ("tile", lambda i: main.struc_Tile(tile_map, i % 1000, i // 1000)))
+
+    slotted = {name: getattr(main, name) for name in SLOTTED_CLASSES}
+    layouts = (("__dict__", {name: unslotted(cls) for name, cls in slotted.items()}),
+               ("__slots__", slotted))
+
+    print("{:>8} {:>10} {:>10}".format("", *(layout for layout, _ in layouts)))
+
+    for name, make in kinds:
+        object_bytes = []
+
+        for layout, classes in layouts:
+            # The generators look the classes up in main as they run
+            for class_name, cls in classes.items():
+                setattr(main, class_name, cls)
+
+            # Made up front so the list's own 8 bytes an object aren't counted
+            objects = [None] * num_objects
+
+            tracemalloc.start()
+            for i in range(num_objects):
+                objects[i] = make(i)
+            object_bytes.append(tracemalloc.get_traced_memory()[0] / num_objects)
+            tracemalloc.stop()
+
+            del objects
+
+        print("{:>8} {:>10.0f} {:>10.0f}  bytes each".format(name, *object_bytes))
+
+    for class_name, cls in slotted.items():
+        setattr(main, class_name, cls)
+
+    main.LEVEL_PREFETCHER.shutdown()
+
+
+BENCHMARKS = {
+    "rooms": bench_rooms,
+    "blits": bench_blits,
+    "turns": bench_turns,
+    "moves": bench_moves,
+    "frames": bench_frames,
+    "combat": bench_combat,
+    "entities": bench_entities,
+    "memory": bench_memory,
+}
+
+
+if __name__ == '__main__':
+    for name in (sys.argv[1:] or BENCHMARKS):
+        print("==", name)
+        BENCHMARKS[name]()
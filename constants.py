@@ -1,5 +1,15 @@
+import os
 import tcod as libtcodpy
 import pygame
+
+# Headless: no window or sound, and nothing drawn. Set GAME_HEADLESS=1
+HEADLESS = os.environ.get("GAME_HEADLESS", "0") != "0"
+
+if HEADLESS:
+    # SDL's dummy drivers still let assets load and convert()
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
 pygame.init()
 pygame.font.init()
 
@@ -13,11 +23,35 @@ CELL_HEIGHT = 32
 # FPS
 GAME_FPS = 60
 
+# Sleep between frames until there's input, or an animation to move on
+GAME_IDLE_WAIT = True
+GAME_IDLE_TIMEOUT = 1000  # ms, the longest a loop sleeps without input
+
+# Push the whole window to the display every frame, not just what changed
+DISPLAY_FULL_FLIP = False
+
+# Blit from the sprite atlas only when a view has this many cells; in
+# smaller ones the area lookups cost more than they save
+RENDER_ATLAS_MIN_CELLS = 1000
+
 # Map Limitations
 MAP_WIDTH = 100
 MAP_HEIGHT = 100
 MAP_MAX_NUM_ROOMS = 10
 MAP_NUM_LEVELS = 1
+MAP_OBJECT_REGION_SIZE = 8  # objects are filed by 8x8 tile regions for lookups
+
+# Chunked Levels (generated piece by piece around the player)
+MAP_CHUNKED = False
+MAP_CHUNKED_WIDTH = 10000
+MAP_CHUNKED_HEIGHT = 10000
+MAP_CHUNK_SIZE = 64
+MAP_CHUNK_NUM_ROOMS = 6
+MAP_CHUNK_KEEP_RADIUS = 2  # chunks kept loaded on each side of the player
+
+# Level Cache (levels the player has left)
+LEVEL_CACHE_BUDGET = 256 * 1024  # bytes kept in memory before spilling
+LEVEL_CACHE_DIR = "savedata/cache"
 
 # Room Limitations
 ROOM_MAX_WIDTH = 5
@@ -41,6 +75,7 @@ COLOR_DEFAULT_BG = COLOR_GREY
 FOV_ALGO = libtcodpy.FOV_BASIC
 FOV_LIGHT_WALLS = True
 TORCH_RADIUS = 10
+FOV_CACHE_SIZE = 64  # recent FOV results kept, keyed on player position
 
 
 # Message Defaults
@@ -52,6 +87,7 @@ FONT_TITLE_SCREEN = pygame.font.SysFont("comicsans", 50)
 FONT_DEBUG_MESSAGE = pygame.font.SysFont("comicsans", 36)
 FONT_MESSAGE_TEXT = pygame.font.SysFont("comicsans", 30)
 FONT_CURSOR_TEXT = pygame.font.SysFont("comicsans", CELL_HEIGHT)
+TEXT_CACHE_SIZE = 256  # rendered strings kept, keyed on font, text and colors
 
 # Depth
 DEPTH_PLAYER = -100
@@ -8,6 +8,15 @@ import random
 import sys
 import datetime
 import os
+import numpy as np
+import collections
+import concurrent.futures
+import multiprocessing
+import zlib
+import shutil
+import time
+import bisect
+import heapq
 
 ##############################################################################
 # STRUCTURES
@@ -15,9 +24,555 @@ import os
 
 
 class struc_Tile:
-    def __init__(self, block_path):
-        self.block_path = block_path
-        self.explored = False
+    '''A single cell of a struc_Map, read and written through the map arrays'''
+
+    __slots__ = ("tile_map", "x", "y")
+
+    def __init__(self, tile_map, x, y):
+        self.tile_map = tile_map
+        self.x = x
+        self.y = y
+
+    @property
+    def block_path(self):
+        return bool(self.tile_map.block_path[self.x, self.y])
+
+    @block_path.setter
+    def block_path(self, value):
+        map_set_block_path(self.x, self.y, value, self.tile_map)
+
+    @property
+    def explored(self):
+        return bool(self.tile_map.explored[self.x, self.y])
+
+    @explored.setter
+    def explored(self, value):
+        self.tile_map.explored[self.x, self.y] = value
+
+
+class struc_TileColumn:
+    '''Lets map[x][y] keep working on top of the map arrays'''
+
+    def __init__(self, tile_map, x):
+        self.tile_map = tile_map
+        self.x = x
+
+    def __getitem__(self, y):
+        return struc_Tile(self.tile_map, self.x, y)
+
+
+class struc_Map:
+    '''A level's tiles, one contiguous array per tile field, indexed [x, y]'''
+
+    # Per-tile fields: name --> (dtype, initial value)
+    tile_fields = {"block_path": (np.bool_, True),
+                   "explored": (np.bool_, False)}
+
+    chunked = False
+
+    def __init__(self, width=constants.MAP_WIDTH, height=constants.MAP_HEIGHT):
+        self.width = width
+        self.height = height
+
+        # Bumped whenever a tile changes, so cached FOV results go stale
+        self.version = 0
+
+        # Rooms map_create tried to place, and how many overlapped others
+        self.room_attempts = 0
+        self.room_rejections = 0
+
+        for name, (dtype, fill) in self.tile_fields.items():
+            setattr(self, name, np.full((width, height), fill, dtype=dtype))
+
+    def __getitem__(self, x):
+        return struc_TileColumn(self, x)
+
+
+class struc_ChunkedField:
+    '''Indexes one tile field of a struc_ChunkedMap like a [x, y] array'''
+
+    def __init__(self, tile_map, name):
+        self.tile_map = tile_map
+        self.name = name
+
+    def key_bounds(self, key):
+        ''' Turns an [x, y] index into tile ranges plus a local index '''
+        bounds = []
+        local_key = []
+
+        for index, size in zip(key, (self.tile_map.width, self.tile_map.height)):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(size)
+
+                if step != 1:
+                    raise IndexError("chunked maps only support step 1 slices")
+
+                bounds.append((start, max(start, stop)))
+                local_key.append(slice(None))
+
+            else:
+                if index < 0:
+                    index += size
+
+                if not 0 <= index < size:
+                    raise IndexError("tile index out of range")
+
+                bounds.append((index, index + 1))
+                local_key.append(0)
+
+        return bounds, tuple(local_key)
+
+    def read(self, x1, y1, x2, y2):
+        dtype = struc_Map.tile_fields[self.name][0]
+        region = np.empty((x2 - x1, y2 - y1), dtype=dtype)
+
+        for chunk, chunk_key, region_key in self.tile_map.chunk_spans(x1, y1, x2, y2):
+            region[region_key] = getattr(chunk, self.name)[chunk_key]
+
+        return region
+
+    def __getitem__(self, key):
+        ((x1, x2), (y1, y2)), local_key = self.key_bounds(key)
+
+        return self.read(x1, y1, x2, y2)[local_key]
+
+    def __setitem__(self, key, value):
+        ((x1, x2), (y1, y2)), local_key = self.key_bounds(key)
+
+        region = self.read(x1, y1, x2, y2)
+        region[local_key] = value
+
+        for chunk, chunk_key, region_key in self.tile_map.chunk_spans(x1, y1, x2, y2):
+            getattr(chunk, self.name)[chunk_key] = region[region_key]
+
+
+class struc_ChunkedMap:
+    '''A level split into square chunks, each one generated on first use
+    and compressed again once the camera is far enough away'''
+
+    chunked = True
+
+    def __init__(self, width, height, seed, chunk_size=constants.MAP_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks_x = math.ceil(width / chunk_size)
+        self.chunks_y = math.ceil(height / chunk_size)
+
+        self.width = self.chunks_x * chunk_size
+        self.height = self.chunks_y * chunk_size
+
+        self.seed = seed
+        self.version = 0
+
+        self.chunks = {}  # (cx, cy) --> struc_Map
+        self.evicted = {}  # (cx, cy) --> compressed tile fields
+
+        # Rooms of newly generated chunks, waiting for their objects
+        self.new_rooms = []
+
+        self.chunks_generated = 0
+        self.chunks_evicted = 0
+        self.chunks_restored = 0
+
+        self.make_fields()
+
+    def make_fields(self):
+        for name in struc_Map.tile_fields:
+            setattr(self, name, struc_ChunkedField(self, name))
+
+    def __getitem__(self, x):
+        return struc_TileColumn(self, x)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        state["evicted"] = dict(self.evicted)
+        for coords, chunk in self.chunks.items():
+            state["evicted"][coords] = self.chunk_pack(chunk)
+
+        state["chunks"] = {}
+        for name in struc_Map.tile_fields:
+            del state[name]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.make_fields()
+
+    def chunk_seed(self, cx, cy, stream=None):
+        seed_text = "{}:{}:{}".format(self.seed, cx, cy)
+
+        # Anything else seeded per chunk gets its own stream
+        if stream:
+            seed_text += ":" + stream
+
+        return zlib.crc32(seed_text.encode())
+
+    def chunk(self, cx, cy):
+        chunk = self.chunks.get((cx, cy))
+
+        if chunk is None:
+            packed = self.evicted.pop((cx, cy), None)
+
+            if packed is None:
+                chunk = self.chunk_generate(cx, cy)
+            else:
+                chunk = self.chunk_unpack(packed)
+                self.chunks_restored += 1
+
+            self.chunks[(cx, cy)] = chunk
+
+        return chunk
+
+    def chunk_generate(self, cx, cy):
+        open_edges = (cx > 0, cx < self.chunks_x - 1,
+                      cy > 0, cy < self.chunks_y - 1)
+
+        chunk, list_of_rooms = map_create_chunk(
+            self.chunk_seed(cx, cy), self.chunk_size, open_edges)
+
+        # Rooms come back in chunk coords
+        origin_x, origin_y = cx * self.chunk_size, cy * self.chunk_size
+
+        for room in list_of_rooms:
+            self.new_rooms.append(obj_Room(
+                (room.x1 + origin_x, room.y1 + origin_y), (room.w, room.h)))
+
+        self.chunks_generated += 1
+
+        return chunk
+
+    def chunk_pack(self, chunk):
+        fields = []
+
+        for name, (dtype, fill) in struc_Map.tile_fields.items():
+            field = getattr(chunk, name)
+
+            if field.dtype == np.bool_:
+                field = np.packbits(field)
+
+            fields.append(field.tobytes())
+
+        return zlib.compress(b"".join(fields))
+
+    def chunk_unpack(self, packed):
+        chunk = struc_Map(self.chunk_size, self.chunk_size)
+        chunk_shape = (self.chunk_size, self.chunk_size)
+        chunk_cells = self.chunk_size * self.chunk_size
+
+        data = zlib.decompress(packed)
+        offset = 0
+
+        for name, (dtype, fill) in struc_Map.tile_fields.items():
+            dtype = np.dtype(dtype)
+
+            if dtype == np.bool_:
+                size = math.ceil(chunk_cells / 8)
+                field = np.unpackbits(np.frombuffer(data, np.uint8, size, offset),
+                                      count=chunk_cells).astype(np.bool_)
+            else:
+                size = chunk_cells * dtype.itemsize
+                field = np.frombuffer(data, dtype, chunk_cells, offset).copy()
+
+            getattr(chunk, name)[:] = field.reshape(chunk_shape)
+            offset += size
+
+        return chunk
+
+    def chunk_spans(self, x1, y1, x2, y2):
+        ''' Yields (chunk, chunk index, region index) covering a tile rect '''
+        size = self.chunk_size
+
+        for cx in range(x1 // size, (x2 - 1) // size + 1):
+            for cy in range(y1 // size, (y2 - 1) // size + 1):
+                origin_x, origin_y = cx * size, cy * size
+
+                span_x1, span_x2 = max(x1, origin_x), min(x2, origin_x + size)
+                span_y1, span_y2 = max(y1, origin_y), min(y2, origin_y + size)
+
+                yield (self.chunk(cx, cy),
+                       (slice(span_x1 - origin_x, span_x2 - origin_x),
+                        slice(span_y1 - origin_y, span_y2 - origin_y)),
+                       (slice(span_x1 - x1, span_x2 - x1),
+                        slice(span_y1 - y1, span_y2 - y1)))
+
+    def update(self, center_x, center_y):
+        ''' Compresses every loaded chunk too far from center_x, center_y '''
+        center_cx = int(center_x) // self.chunk_size
+        center_cy = int(center_y) // self.chunk_size
+
+        for (cx, cy) in list(self.chunks):
+            if max(abs(cx - center_cx), abs(cy - center_cy)) > constants.MAP_CHUNK_KEEP_RADIUS:
+                self.evicted[(cx, cy)] = self.chunk_pack(self.chunks.pop((cx, cy)))
+                self.chunks_evicted += 1
+
+    def evict_all(self):
+        for coords in list(self.chunks):
+            self.evicted[coords] = self.chunk_pack(self.chunks.pop(coords))
+            self.chunks_evicted += 1
+
+    def take_new_rooms(self):
+        new_rooms, self.new_rooms = self.new_rooms, []
+        return new_rooms
+
+
+class struc_Level:
+    '''A level the player has left, kept as the changes on top of its seeds'''
+
+    def __init__(self, depth, player_coords, level_map, level_objects):
+        self.depth = depth
+        self.player_coords = player_coords
+
+        self.explored = None
+        self.block_path = None
+        self.chunked_map = None
+
+        if level_map.chunked:
+            # Chunks are only generated as they are visited, so the map
+            # is kept as it is, squeezed down to its compressed chunks
+            level_map.evict_all()
+            self.chunked_map = level_map
+
+        else:
+            self.explored = np.packbits(level_map.explored)
+
+            # Tiles only need keeping if something was dug or built since
+            if level_map.version:
+                self.block_path = np.packbits(level_map.block_path)
+
+        unchanged_ids = []
+        self.changed_objects = []
+
+        for obj in level_objects:
+            if obj is PLAYER:
+                continue
+
+            # Chunked levels are not rebuilt, so they keep all their objects
+            spawned_here = (obj.spawn_id and obj.spawn_id[0] == depth
+                            and not self.chunked_map)
+
+            if spawned_here and helper_actor_state(obj) == obj.spawn_state:
+                unchanged_ids.append(obj.spawn_id[1])
+            else:
+                self.changed_objects.append(obj)
+
+        # One bit per object the level spawned with: still there, untouched
+        unchanged = np.zeros(max(unchanged_ids, default=-1) + 1, dtype=np.bool_)
+        unchanged[unchanged_ids] = True
+        self.unchanged = np.packbits(unchanged)
+
+    def apply(self, level_map, level_objects):
+        ''' Replays the changes onto a freshly regenerated map and objects '''
+        if self.explored is not None:
+            map_size = level_map.width * level_map.height
+            map_shape = (level_map.width, level_map.height)
+
+            level_map.explored[:] = np.unpackbits(
+                self.explored, count=map_size).reshape(map_shape)
+
+            if self.block_path is not None:
+                level_map.block_path[:] = np.unpackbits(
+                    self.block_path, count=map_size).reshape(map_shape)
+                level_map.version += 1
+
+        unchanged = np.unpackbits(self.unchanged)
+
+        kept_objects = [obj for obj in level_objects
+                        if obj is PLAYER or
+                        (obj.spawn_id[1] < len(unchanged) and unchanged[obj.spawn_id[1]])]
+
+        level_objects.clear()
+        level_objects.extend(kept_objects + self.changed_objects)
+
+        level_objects.move(PLAYER, *self.player_coords)
+
+
+class struc_ObjectList(list):
+    '''The objects on the current level, in the order they were added.
+    Also files them by tile, for lookups at a point, by region of the
+    map, each region kept in draw order (deepest first), and by the
+    components the turns run, so neither lookups, drawing nor turns scan
+    the level or sort'''
+
+    # The components objects are filed by, see having()
+    registered_components = ("ai", "exitportal")
+
+    def __init__(self, objects=()):
+        super().__init__()
+
+        # component name --> objects that have one, in the order they were added
+        self.components = {name: {} for name in self.registered_components}
+
+        # (x, y) --> objects on that tile, in the order they were added
+        self.cells = {}
+
+        # (region x, region y) --> objects in draw order, and their draw keys
+        self.regions = {}
+        self.region_keys = {}
+
+        # When each object was added, so equal depths draw in that order
+        self.added = {}
+        self.added_count = 0
+
+        self.extend(objects)
+
+    def __reduce__(self):
+        # Rebuilt through append, which also rebuilds the regions
+        return (struc_ObjectList, (list(self),))
+
+    def append(self, obj):
+        super().append(obj)
+
+        self.added[obj] = self.added_count
+        self.added_count += 1
+
+        self.cell_insert(obj)
+        self.region_insert(obj)
+
+        for name, members in self.components.items():
+            if getattr(obj, name):
+                members[obj] = None
+
+    def extend(self, objects):
+        for obj in objects:
+            self.append(obj)
+
+    def remove(self, obj):
+        super().remove(obj)
+
+        self.cell_remove(obj)
+        self.region_remove(obj)
+        del self.added[obj]
+
+        for members in self.components.values():
+            members.pop(obj, None)
+
+    def clear(self):
+        super().clear()
+
+        self.cells.clear()
+        self.regions.clear()
+        self.region_keys.clear()
+        self.added.clear()
+
+        for members in self.components.values():
+            members.clear()
+
+    def move(self, obj, x, y):
+        self.cell_remove(obj)
+
+        if self.region(x, y) == self.region(obj.x, obj.y):
+            obj.x, obj.y = x, y
+
+        else:
+            self.region_remove(obj)
+            obj.x, obj.y = x, y
+            self.region_insert(obj)
+
+        self.cell_insert(obj)
+
+    def depth_change(self, obj, depth):
+        self.region_remove(obj)
+        obj.depth = depth
+        self.region_insert(obj)
+
+    def component_change(self, obj, name, component):
+        ''' Gives obj a new component, or takes it away with None '''
+        setattr(obj, name, component)
+
+        members = self.components[name]
+
+        if component is None or obj not in self.added:
+            members.pop(obj, None)
+
+        elif obj not in members:
+            members[obj] = None
+
+            if any(self.added[other] > self.added[obj] for other in members):
+                self.components[name] = dict.fromkeys(
+                    sorted(members, key=self.added.get))
+
+    def having(self, name):
+        ''' The objects with that component, oldest first. A copy, so they
+        can be added, removed or changed while it is looped over '''
+        return list(self.components[name])
+
+    def at(self, x, y):
+        ''' The objects on tile x, y, oldest first. Don't change the list '''
+        return self.cells.get((x, y), ())
+
+    def in_rect(self, x1, y1, x2, y2):
+        ''' The objects inside a rect of the map, in no particular order '''
+        size = constants.MAP_OBJECT_REGION_SIZE
+
+        for rx in range(x1 // size, (x2 - 1) // size + 1):
+            for ry in range(y1 // size, (y2 - 1) // size + 1):
+                for obj in self.regions.get((rx, ry), ()):
+                    if x1 <= obj.x < x2 and y1 <= obj.y < y2:
+                        yield obj
+
+    def in_draw_order(self, x1, y1, x2, y2):
+        ''' The objects inside a rect of the map, deepest first '''
+        size = constants.MAP_OBJECT_REGION_SIZE
+
+        regions = [self.regions[(rx, ry)]
+                   for rx in range(x1 // size, (x2 - 1) // size + 1)
+                   for ry in range(y1 // size, (y2 - 1) // size + 1)
+                   if (rx, ry) in self.regions]
+
+        for obj in heapq.merge(*regions, key=self.draw_key):
+            if x1 <= obj.x < x2 and y1 <= obj.y < y2:
+                yield obj
+
+    def draw_key(self, obj):
+        return (-obj.depth, self.added[obj])
+
+    def cell_insert(self, obj):
+        cell_objects = self.cells.setdefault((obj.x, obj.y), [])
+
+        # Kept in the order they were added, like the level's list
+        i = len(cell_objects)
+
+        while i and self.added[cell_objects[i - 1]] > self.added[obj]:
+            i -= 1
+
+        cell_objects.insert(i, obj)
+
+    def cell_remove(self, obj):
+        cell_objects = self.cells[(obj.x, obj.y)]
+        cell_objects.remove(obj)
+
+        if not cell_objects:
+            del self.cells[(obj.x, obj.y)]
+
+    def region(self, x, y):
+        size = constants.MAP_OBJECT_REGION_SIZE
+
+        return (x // size, y // size)
+
+    def region_insert(self, obj):
+        region = self.region(obj.x, obj.y)
+        draw_key = self.draw_key(obj)
+
+        region_keys = self.region_keys.setdefault(region, [])
+
+        i = bisect.bisect(region_keys, draw_key)
+
+        region_keys.insert(i, draw_key)
+        self.regions.setdefault(region, []).insert(i, obj)
+
+    def region_remove(self, obj):
+        region = self.region(obj.x, obj.y)
+        region_objects = self.regions[region]
+
+        i = region_objects.index(obj)
+
+        del region_objects[i]
+        del self.region_keys[region][i]
+
+        if not region_objects:
+            del self.regions[region]
+            del self.region_keys[region]
 
 
 class struc_Preferences:
@@ -32,6 +587,12 @@ class struc_Preferences:
 
 
 class obj_Actor:
+    # Fields declared up front, so actors don't each carry a __dict__
+    __slots__ = ("x", "y", "name_object", "animation_key", "state", "depth",
+                 "spawn_id", "spawn_state", "animation", "animation_speed",
+                 "animation_phase", "creature", "ai", "container", "item",
+                 "equipment", "stairs", "exitportal")
+
     def __init__(self, x, y,
                  name_object,
                  animation_key,
@@ -52,14 +613,16 @@ class obj_Actor:
         self.state = state
         self.depth = depth
 
+        # Set by map_place_objects for actors a level was generated with
+        self.spawn_id = None
+        self.spawn_state = None
+
         # list of images
         self.animation = ASSETS.animation_dict[self.animation_key]
         self.animation_speed = animation_speed / 1.0  # in seconds
 
-        # animation flicker speedd
-        self.flicker_speed = self.animation_speed / len(self.animation)
-        self.flicker_timer = 0.0
-        self.sprite_image = 0
+        # Frames ahead of the animation clock, so it starts on its first frame
+        self.animation_phase = -ANIMATION_CLOCK.step(self.animation_id)
 
         self.creature = creature
         if self.creature:
@@ -92,6 +655,10 @@ class obj_Actor:
         if self.exitportal:
             self.exitportal.owner = self
 
+    @property
+    def animation_id(self):
+        return (self.animation_key, self.animation_speed)
+
     @property  # Can call the method as a property
     def display_name(self):
         if self.creature:
@@ -104,28 +671,12 @@ class obj_Actor:
                 return (self.name_object)
 
     def draw(self):
-        is_visible = libtcodpy.map_is_in_fov(FOV_MAP, self.x, self.y)
-
-        if is_visible:
-            if len(self.animation) == 1:
-                SURFACE_MAP.blit(
-                    self.animation[0], (self.x * constants.CELL_WIDTH, self.y * constants.CELL_HEIGHT))
-
-            elif len(self.animation) > 1:
-                if CLOCK.get_fps() > 0.0:
-                    self.flicker_timer += 1 / CLOCK.get_fps()
-
-                if self.flicker_timer >= self.flicker_speed:
-                    self.flicker_timer = 0.0
-
-                    if self.sprite_image >= len(self.animation) - 1:
-                        self.sprite_image = 0
+        ''' Queues the sprite; draw_objects picks who is on camera and in view '''
+        sprite = self.animation[ANIMATION_CLOCK.frame(self)]
 
-                    else:
-                        self.sprite_image += 1
+        RENDER_QUEUE.add(sprite, CAMERA.tile_to_cam((self.x, self.y)))
 
-                SURFACE_MAP.blit(
-                    self.animation[self.sprite_image], (self.x * constants.CELL_WIDTH, self.y * constants.CELL_HEIGHT))
+        SCREEN_UPDATES.actor(self, sprite, CAMERA.tile_to_cam((self.x, self.y)))
 
     def distance_to(self, other):
         dx = other.x - self.x
@@ -164,12 +715,71 @@ class obj_Actor:
 
 class obj_Game:
     def __init__(self):
-        self.current_objects = []
+        self.current_objects = struc_ObjectList()
         self.message_history = []
-        self.maps_previous = []
-        self.maps_next = []
 
-        self.current_map, self.current_rooms = map_create()
+        # Every level is rebuilt from seeds derived from this one
+        self.run_seed = RANDOM_ENGINE.getrandbits(32)
+
+        # Levels the player has left, by depth, and the one they're on
+        self.levels = obj_LevelStore(os.path.join(
+            constants.LEVEL_CACHE_DIR, "{:08x}".format(self.run_seed)))
+        self.depth = 1
+
+        self.current_map, self.current_rooms = map_create_level(
+            self.map_seed(1))
+        map_make_fov(self.current_map)
+
+    def level_seed(self, depth, stream):
+        # crc32 rather than hash() so seeds are stable across runs
+        seed_text = "{}:{}:{}".format(self.run_seed, depth, stream)
+        return zlib.crc32(seed_text.encode())
+
+    def map_seed(self, depth):
+        return self.level_seed(depth, "map")
+
+    def objects_seed(self, depth):
+        return self.level_seed(depth, "objects")
+
+    def prefetch_next(self):
+        ''' Starts building the level below while this one is played '''
+        next_depth = self.depth + 1
+
+        # Chunked levels cost next to nothing until they are walked into
+        if constants.MAP_CHUNKED:
+            return
+
+        if next_depth not in self.levels and next_depth <= constants.MAP_NUM_LEVELS:
+            LEVEL_PREFETCHER.request(next_depth, self.map_seed(next_depth))
+
+    def level_pack(self):
+        ''' Shrinks the current level down to what changed since it was made '''
+        for obj in self.current_objects:
+            obj.animation_destroy()
+
+        return struc_Level(self.depth, (PLAYER.x, PLAYER.y),
+                           self.current_map, self.current_objects)
+
+    def level_unpack(self, level):
+        ''' Rebuilds a packed level from its seeds, then replays its changes '''
+        self.current_objects = struc_ObjectList([PLAYER])
+
+        if level.chunked_map:
+            self.current_map, self.current_rooms = level.chunked_map, []
+
+        else:
+            self.current_map, self.current_rooms = map_create(
+                self.map_seed(level.depth))
+
+            map_place_objects(self.current_rooms,
+                              self.objects_seed(level.depth))
+
+        level.apply(self.current_map, self.current_objects)
+
+        for obj in self.current_objects:
+            obj.animation_init()
+
+        map_make_fov(self.current_map)
 
     def transition_next(self):
 
@@ -177,62 +787,207 @@ class obj_Game:
 
         FOV_CALCULATE = True
 
-        self.maps_previous.append((PLAYER.x,
-                                   PLAYER.y,
-                                   self.current_map,
-                                   self.current_rooms,
-                                   self.current_objects))
+        self.levels.put(self.depth, self.level_pack())
 
-        for obj in self.current_objects:
-            obj.animation_destroy()
+        self.depth += 1
 
-        if len(self.maps_next) == 0:
+        if self.depth not in self.levels:
 
             # Clear the previous items and enemies
-            self.current_objects = [PLAYER]
+            self.current_objects = struc_ObjectList([PLAYER])
 
             PLAYER.animation_init()
 
-            self.current_map, self.current_rooms = map_create()
-            map_place_objects(self.current_rooms)
-
-        else:
-            (PLAYER.x, PLAYER.y, self.current_map, self.current_rooms,
-             self.current_objects) = self.maps_next[-1]
+            prefetched_level = LEVEL_PREFETCHER.take(self.depth)
 
-            for obj in self.current_objects:
-                obj.animation_init()
+            if prefetched_level:
+                self.current_map, self.current_rooms = prefetched_level
+            else:
+                self.current_map, self.current_rooms = map_create_level(
+                    self.map_seed(self.depth))
 
             map_make_fov(self.current_map)
-            FOV_CALCULATE = True
+            map_place_objects(self.current_rooms,
+                              self.objects_seed(self.depth))
 
-            # Stack method of removal
-            del self.maps_next[-1]
+            self.prefetch_next()
+
+        else:
+            self.level_unpack(self.levels.take(self.depth))
 
     def transition_previous(self):
         global FOV_CALCULATE
 
-        if len(self.maps_previous) != 0:
-
-            for obj in self.current_objects:
-                obj.animation_destroy()
+        if self.depth > 1:
 
-            self.maps_next.append((PLAYER.x,
-                                   PLAYER.y,
-                                   self.current_map,
-                                   self.current_rooms,
-                                   self.current_objects))
+            self.levels.put(self.depth, self.level_pack())
 
-            (PLAYER.x, PLAYER.y, self.current_map, self.current_rooms,
-             self.current_objects) = self.maps_previous[-1]
+            self.depth -= 1
 
-            for obj in self.current_objects:
-                obj.animation_init()
+            self.level_unpack(self.levels.take(self.depth))
 
-            map_make_fov(self.current_map)
             FOV_CALCULATE = True
 
-            del self.maps_previous[-1]
+
+class obj_LevelStore:
+    '''Keeps the levels the player has left, by depth. Past the memory
+    budget the least recently visited ones are spilled to cache_dir'''
+
+    def __init__(self, cache_dir, budget=constants.LEVEL_CACHE_BUDGET):
+        self.cache_dir = cache_dir
+        self.budget = budget
+
+        self.in_memory = collections.OrderedDict()  # depth --> (level, size)
+        self.on_disk = {}  # depth --> size of the file
+
+        self.evictions = 0
+        self.reloads = 0
+        self.reload_seconds = 0.0
+
+    def __contains__(self, depth):
+        return depth in self.in_memory or depth in self.on_disk
+
+    def __len__(self):
+        return len(self.in_memory) + len(self.on_disk)
+
+    def __getstate__(self):
+        # Saves carry every level, so they don't depend on the cache dir
+        state = self.__dict__.copy()
+
+        state["in_memory"] = collections.OrderedDict(self.in_memory)
+        for depth in self.on_disk:
+            level = self.level_read(depth)
+            state["in_memory"][depth] = (level, len(pickle.dumps(level)))
+
+        state["on_disk"] = {}
+
+        return state
+
+    @property
+    def bytes_in_memory(self):
+        return sum(size for level, size in self.in_memory.values())
+
+    @property
+    def bytes_on_disk(self):
+        return sum(self.on_disk.values())
+
+    def level_path(self, depth):
+        return os.path.join(self.cache_dir, "level_{}.gz".format(depth))
+
+    def level_read(self, depth):
+        with gzip.open(self.level_path(depth), 'rb') as file:
+            return pickle.load(file)
+
+    def put(self, depth, level):
+        self.in_memory[depth] = (level, len(pickle.dumps(level)))
+        self.in_memory.move_to_end(depth)
+
+        # Always keep the level just left in memory, it's the likeliest
+        # one to come back to
+        while self.bytes_in_memory > self.budget and len(self.in_memory) > 1:
+            self.evict()
+
+    def evict(self):
+        depth, (level, size) = self.in_memory.popitem(last=False)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with gzip.open(self.level_path(depth), 'wb') as file:
+            pickle.dump(level, file)
+
+        self.on_disk[depth] = os.path.getsize(self.level_path(depth))
+        self.evictions += 1
+
+    def take(self, depth):
+        if depth in self.in_memory:
+            level, size = self.in_memory.pop(depth)
+            return level
+
+        start = time.perf_counter()
+
+        level = self.level_read(depth)
+        os.remove(self.level_path(depth))
+        del self.on_disk[depth]
+
+        self.reloads += 1
+        self.reload_seconds += time.perf_counter() - start
+
+        return level
+
+    def close(self):
+        ''' Removes this run's cache dir, once the levels are saved or lost '''
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.on_disk = {}
+
+
+class obj_LevelPrefetcher:
+    '''Generates the next level's map in a worker process ahead of time'''
+
+    def __init__(self):
+        self.pool = None
+        self.pending_depth = None
+        self.pending = None
+
+        # Jobs nobody wants any more that were already running, so could
+        # not be cancelled. Their results are thrown away when they finish
+        self.stale = set()
+
+        # How often a staircase found its level ready
+        self.hits = 0
+        self.misses = 0
+
+    def request(self, depth, seed):
+        if self.pending_depth == depth:
+            return
+
+        if self.pool is None:
+            # Spawned rather than forked: by now pygame has SDL and mixer
+            # threads running, and a forked child could inherit a held lock
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+        try:
+            self.pending = self.pool.submit(map_create, seed)
+
+        except (concurrent.futures.process.BrokenProcessPool, RuntimeError):
+            # The worker died; this staircase makes its level itself, and
+            # the next request starts a new pool
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            self.pending_depth = None
+            self.pending = None
+            return
+
+        self.pending_depth = depth
+
+    def take(self, depth):
+        ''' Returns the prefetched (map, rooms), or None if it isn't ready '''
+        pending_depth, pending = self.pending_depth, self.pending
+
+        self.pending_depth = None
+        self.pending = None
+
+        if (pending_depth == depth and pending.done()
+                and pending.exception() is None):
+            self.hits += 1
+            return pending.result()
+
+        # Only stops a job still waiting in the queue, not a running one
+        if pending and not pending.cancel() and not pending.done():
+            self.stale.add(pending)
+            pending.add_done_callback(self.stale.discard)
+
+        self.misses += 1
+        return None
+
+    def shutdown(self):
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+        self.pool = None
+        self.pending_depth = None
+        self.pending = None
+        self.stale.clear()
 
 
 class obj_Spritesheet:
@@ -249,40 +1004,260 @@ class obj_Spritesheet:
 
         image = pygame.Surface([width, height]).convert()
 
-        image.blit(self.sprite_sheet, (0, 0), (
-            self.tiledict[column] * width, row * height, width, height))
+        image.blit(self.sprite_sheet, (0, 0), (
+            self.tiledict[column] * width, row * height, width, height))
+
+        image.set_colorkey(constants.COLOR_BLACK)  # addresses transparency
+
+        if scale:
+            (new_w, new_h) = scale
+            image = pygame.transform.scale(image, (new_w, new_h))
+
+        image_list.append(image)
+
+        return image_list
+
+    def get_animation(self, column, row, width=constants.CELL_WIDTH, height=constants.CELL_HEIGHT, num_sprites=1, scale=None):
+        image_list = []
+
+        for i in range(num_sprites):
+            # Create blank surface
+            image = pygame.Surface([width, height]).convert()
+
+            # Copy image to surface
+            image.blit(self.sprite_sheet, (0, 0), (
+                self.tiledict[column] * width + (width * i), row * height, width, height))
+
+            # Set transparency key to black
+            image.set_colorkey(constants.COLOR_BLACK)
+
+            if scale:
+                (new_w, new_h) = scale
+                image = pygame.transform.scale(image, (new_w, new_h))
+
+            image_list.append(image)
+
+        return image_list
+
+
+class obj_SpriteAtlas:
+    '''Packs sprites into a few shared surfaces, one per way of blitting
+    (opaque, colorkey, per-pixel alpha), so a frame's blits can be handed
+    to pygame in one batch without making any sprite blit slower'''
+
+    def __init__(self, sprites, width=512):
+        # sprite --> (page, area of the page)
+        self.areas = {}
+
+        page_sprites = {}
+
+        for sprite in sprites:
+            blit_mode = (sprite.get_flags() & pygame.SRCALPHA, sprite.get_colorkey())
+
+            if sprite not in page_sprites.setdefault(blit_mode, []):
+                page_sprites[blit_mode].append(sprite)
+
+        for (alpha, colorkey), sprites in page_sprites.items():
+            page_areas, page_height = self.pack(sprites, width)
+
+            if alpha:
+                page = pygame.Surface((width, page_height), pygame.SRCALPHA).convert_alpha()
+                page.fill((0, 0, 0, 0))
+
+            else:
+                page = pygame.Surface((width, page_height)).convert()
+
+                if colorkey:
+                    page.fill(colorkey)
+                    page.set_colorkey(colorkey)
+
+            for sprite, area in zip(sprites, page_areas):
+                # Copy alpha pixels as they are, rather than blending them
+                # onto the empty page
+                page.blit(sprite, area,
+                          special_flags=pygame.BLEND_RGBA_ADD if alpha else 0)
+
+                self.areas[sprite] = (page, area)
+
+    def pack(self, sprites, width):
+        ''' Shelf packing: left to right, a new shelf when a row is full '''
+        areas = []
+        shelf_x, shelf_y, shelf_height = 0, 0, 0
+
+        for sprite in sprites:
+            sprite_w, sprite_h = sprite.get_size()
+
+            if shelf_x + sprite_w > width:
+                shelf_x, shelf_y, shelf_height = 0, shelf_y + shelf_height, 0
+
+            areas.append(pygame.Rect(shelf_x, shelf_y, sprite_w, sprite_h))
+
+            shelf_x += sprite_w
+            shelf_height = max(shelf_height, sprite_h)
+
+        return areas, shelf_y + shelf_height
+
+
+class obj_RenderQueue:
+    '''Collects a frame's blits and draws them with a single Surface.blits
+    call. Views of constants.RENDER_ATLAS_MIN_CELLS cells or more blit
+    from areas of the atlas pages; smaller ones, the game's own camera
+    among them, blit the sprites themselves, which is quicker there'''
+
+    def __init__(self, atlas, num_cells):
+        self.atlas = atlas
+        self.blits = []
+
+        if num_cells >= constants.RENDER_ATLAS_MIN_CELLS:
+            self.areas = atlas.areas
+        else:
+            self.areas = {}
+
+    def add(self, sprite, dest):
+        page_area = self.areas.get(sprite)
+
+        if page_area:
+            page, area = page_area
+            self.blits.append((page, dest, area))
+
+        else:
+            self.blits.append((sprite, dest))
+
+    def draw(self, surface):
+        surface.blits(self.blits, doreturn=False)
+
+        self.blits = []
+
+
+class obj_TextCache:
+    '''Rendered text, most recently used last, and the size of each font'''
+
+    def __init__(self):
+        self.surfaces = collections.OrderedDict()  # (font, text, fg, bg) --> surface
+        self.font_sizes = {}
+
+        # How often a string was already rendered
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, text_color, back_color=None):
+        key = (font, text, text_color, back_color)
+
+        text_surface = self.surfaces.get(key)
+
+        if text_surface:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return text_surface
+
+        if back_color:
+            text_surface = font.render(text, False, text_color, back_color)
+        else:
+            text_surface = font.render(text, False, text_color)
+
+        self.surfaces[key] = text_surface
+        self.misses += 1
+
+        if len(self.surfaces) > constants.TEXT_CACHE_SIZE:
+            self.surfaces.popitem(last=False)
+
+        return text_surface
+
+    def font_size(self, font):
+        ''' Width and height of a character in font '''
+        if font not in self.font_sizes:
+            self.font_sizes[font] = font.render('a', False, (0, 0, 0)).get_size()
+
+        return self.font_sizes[font]
+
+
+class obj_MessagePanel:
+    '''The last few game messages, drawn into one surface that is only
+    redrawn when a message is added'''
+
+    def __init__(self):
+        text_height = helper_text_height(constants.FONT_MESSAGE_TEXT)
+
+        self.rect = pygame.Rect(0, 0, constants.CAMERA_WIDTH,
+                                constants.NUM_MESSAGES * text_height)
+        self.rect.bottom = constants.CAMERA_HEIGHT - 5
+
+        # See-through between and after the lines, like the map around them
+        self.surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+
+        self.history = None
+        self.history_length = 0
+
+        self.redraws = 0
+
+    def update(self, message_history):
+        if (message_history is self.history
+                and len(message_history) == self.history_length):
+            return
+
+        self.history = message_history
+        self.history_length = len(message_history)
+
+        to_draw = message_history[-constants.NUM_MESSAGES:]
+
+        text_height = helper_text_height(constants.FONT_MESSAGE_TEXT)
+
+        self.surface.fill((0, 0, 0, 0))
+
+        for i, (message, color) in enumerate(to_draw):
+            draw_text(self.surface, message, constants.FONT_MESSAGE_TEXT,
+                      (0, i * text_height), color, constants.COLOR_BLACK)
+
+        self.redraws += 1
+
+    def draw(self, surface):
+        surface.blit(self.surface, self.rect)
+
+
+class obj_AnimationClock:
+    '''One clock for every animation, in real milliseconds. Actors only
+    keep an animation id and a phase; each animation is stepped once per
+    tick, however many actors share it'''
+
+    def __init__(self):
+        self.now = pygame.time.get_ticks()
+        self.steps = {}  # animation id --> frames shown since the clock started
+
+        # When the soonest of this tick's animations shows its next frame
+        self.next_frame_at = None
 
-        image.set_colorkey(constants.COLOR_BLACK)  # addresses transparency
+    def tick(self):
+        self.now = pygame.time.get_ticks()
+        self.steps.clear()
 
-        if scale:
-            (new_w, new_h) = scale
-            image = pygame.transform.scale(image, (new_w, new_h))
+        self.next_frame_at = None
 
-        image_list.append(image)
+    def step(self, animation_id):
+        if animation_id not in self.steps:
+            animation_key, animation_speed = animation_id
+            num_frames = len(ASSETS.animation_dict[animation_key])
 
-        return image_list
+            # The whole animation plays once every animation_speed seconds
+            frame_ms = animation_speed * 1000 / num_frames
 
-    def get_animation(self, column, row, width=constants.CELL_WIDTH, height=constants.CELL_HEIGHT, num_sprites=1, scale=None):
-        image_list = []
+            self.steps[animation_id] = int(self.now // frame_ms)
 
-        for i in range(num_sprites):
-            # Create blank surface
-            image = pygame.Surface([width, height]).convert()
+            if num_frames > 1:
+                next_frame_at = (self.steps[animation_id] + 1) * frame_ms
 
-            # Copy image to surface
-            image.blit(self.sprite_sheet, (0, 0), (
-                self.tiledict[column] * width + (width * i), row * height, width, height))
+                if self.next_frame_at is None or next_frame_at < self.next_frame_at:
+                    self.next_frame_at = next_frame_at
 
-            # Set transparency key to black
-            image.set_colorkey(constants.COLOR_BLACK)
+        return self.steps[animation_id]
 
-            if scale:
-                (new_w, new_h) = scale
-                image = pygame.transform.scale(image, (new_w, new_h))
+    def frame(self, actor):
+        ''' Index of the frame of its animation the actor shows now '''
+        num_frames = len(actor.animation)
 
-            image_list.append(image)
+        if num_frames == 1:
+            return 0
 
-        return image_list
+        return (self.step(actor.animation_id) + actor.animation_phase) % num_frames
 
 
 class obj_Room:
@@ -368,6 +1343,211 @@ class obj_Camera:
 
         return (map_x, map_y)
 
+    def tile_to_cam(self, coords):
+        ''' Map tile address --> pixel position on the camera surface '''
+        tile_x, tile_y = coords
+        cam_x, cam_y = self.map_address
+
+        # Distance from the camera center, then from the camera's corner
+        cam_d_x = (tile_x - cam_x) * constants.CELL_WIDTH
+        cam_d_y = (tile_y - cam_y) * constants.CELL_HEIGHT
+
+        return (int(cam_d_x + self.width / 2), int(cam_d_y + self.height / 2))
+
+
+class obj_TerrainLayer:
+    '''The map tiles around the camera, pre-rendered. A tile is only
+    redrawn when it scrolls into view or its FOV state changes'''
+
+    # Tile states, also the index into the tile sprites
+    UNEXPLORED = 0
+    EXPLORED_WALL = 1
+    EXPLORED_FLOOR = 2
+    VISIBLE_WALL = 3
+    VISIBLE_FLOOR = 4
+    STALE = 255
+
+    def __init__(self):
+        # One spare tile each way, since the camera rarely sits on a tile edge
+        self.width = constants.CAMERA_WIDTH // constants.CELL_WIDTH + 2
+        self.height = constants.CAMERA_HEIGHT // constants.CELL_HEIGHT + 2
+
+        self.surface = pygame.Surface((self.width * constants.CELL_WIDTH,
+                                       self.height * constants.CELL_HEIGHT))
+
+        self.state = np.full((self.width, self.height),
+                             self.STALE, dtype=np.uint8)
+        self.origin = (0, 0)
+
+        self.queue = obj_RenderQueue(ASSETS.atlas, self.width * self.height)
+
+        self.tile_map = None
+        self.drawn_key = None
+        self.drawn_visible = None
+
+        self.tiles_redrawn = 0
+
+    def scroll(self, new_origin):
+        ''' Moves the drawn tiles along with the camera, marks the rest stale '''
+        dx = new_origin[0] - self.origin[0]
+        dy = new_origin[1] - self.origin[1]
+
+        self.surface.scroll(-dx * constants.CELL_WIDTH, -dy * constants.CELL_HEIGHT)
+
+        old_state = self.state
+        self.state = np.full_like(old_state, self.STALE)
+
+        if abs(dx) < self.width and abs(dy) < self.height:
+            self.state[max(-dx, 0):self.width - max(dx, 0),
+                       max(-dy, 0):self.height - max(dy, 0)] = \
+                old_state[max(dx, 0):self.width - max(-dx, 0),
+                          max(dy, 0):self.height - max(-dy, 0)]
+
+    def tile_states(self):
+        x1, y1 = self.origin
+        x2, y2 = x1 + self.width, y1 + self.height
+
+        states = np.full((self.width, self.height),
+                         self.UNEXPLORED, dtype=np.uint8)
+
+        on_x1, on_y1 = max(x1, 0), max(y1, 0)
+        on_x2 = min(x2, self.tile_map.width)
+        on_y2 = min(y2, self.tile_map.height)
+
+        if on_x1 < on_x2 and on_y1 < on_y2:
+            on_map = (slice(on_x1, on_x2), slice(on_y1, on_y2))
+
+            is_floor = ~self.tile_map.block_path[on_map]
+            explored = self.tile_map.explored[on_map]
+            visible = map_visible_window(on_x1, on_y1, on_x2, on_y2)
+
+            states[on_x1 - x1:on_x2 - x1, on_y1 - y1:on_y2 - y1] = (
+                np.where(visible, self.VISIBLE_WALL,
+                         np.where(explored, self.EXPLORED_WALL, self.UNEXPLORED))
+                + (is_floor & (visible | explored)))
+
+        return states
+
+    def update(self, tile_map):
+        camera_rect = CAMERA.rectangle
+        origin = (math.floor(camera_rect.left / constants.CELL_WIDTH),
+                  math.floor(camera_rect.top / constants.CELL_HEIGHT))
+
+        if tile_map is not self.tile_map:
+            self.tile_map = tile_map
+            self.state[:] = self.STALE
+
+        elif origin != self.origin:
+            self.scroll(origin)
+
+        self.origin = origin
+
+        # Nothing to do until the FOV, the tiles or the camera change
+        drawn_key = (tile_map.version, origin, FOV_WINDOW)
+
+        if (drawn_key == self.drawn_key and FOV_VISIBLE is self.drawn_visible
+                and not (self.state == self.STALE).any()):
+            return
+
+        self.drawn_key = drawn_key
+        self.drawn_visible = FOV_VISIBLE
+
+        states = self.tile_states()
+
+        tile_sprites = (None, ASSETS.S_WALLEXPLORED, ASSETS.S_FLOOREXPLORED,
+                        ASSETS.S_WALL, ASSETS.S_FLOOR)
+
+        for i, j in zip(*np.nonzero(states != self.state)):
+            tile_rect = pygame.Rect(i * constants.CELL_WIDTH, j * constants.CELL_HEIGHT,
+                                    constants.CELL_WIDTH, constants.CELL_HEIGHT)
+
+            self.queue.add(ASSETS.S_BACKGROUND, tile_rect.topleft)
+
+            if states[i, j] != self.UNEXPLORED:
+                self.queue.add(tile_sprites[states[i, j]], tile_rect.topleft)
+
+            SCREEN_UPDATES.add(tile_rect.move(CAMERA.tile_to_cam(self.origin)))
+
+            self.tiles_redrawn += 1
+
+        self.queue.draw(self.surface)
+
+        self.state = states
+
+    def draw(self, surface):
+        surface.blit(self.surface, CAMERA.tile_to_cam(self.origin))
+
+
+class obj_ScreenUpdates:
+    '''Collects the parts of the window that changed since the last
+    display update, so only those are pushed to the display'''
+
+    def __init__(self):
+        self.rects = []
+        self.full = True
+
+        self.camera_position = None
+
+        # What was drawn last frame: actor --> (sprite, position), and
+        # named bits of text or overlay --> (content, rect)
+        self.actors_drawn = {}
+        self.actors_drawing = {}
+        self.regions = {}
+
+    def add(self, rect):
+        self.rects.append(pygame.Rect(rect))
+
+    def add_all(self):
+        self.full = True
+
+    def camera(self, position):
+        if position != self.camera_position:
+            self.camera_position = position
+            self.add_all()
+
+    def actor(self, actor, sprite, position):
+        self.actors_drawing[actor] = (sprite, position)
+
+    def actors_done(self):
+        ''' Marks every actor that moved, changed sprite, appeared or went '''
+        for actor, (sprite, position) in self.actors_drawing.items():
+            drawn = self.actors_drawn.pop(actor, None)
+
+            if drawn != (sprite, position):
+                self.add(sprite.get_rect(topleft=position))
+
+                if drawn:
+                    old_sprite, old_position = drawn
+                    self.add(old_sprite.get_rect(topleft=old_position))
+
+        for old_sprite, old_position in self.actors_drawn.values():
+            self.add(old_sprite.get_rect(topleft=old_position))
+
+        self.actors_drawn = self.actors_drawing
+        self.actors_drawing = {}
+
+    def region(self, name, content, rect):
+        ''' Marks rect, and where it was before, if its content changed '''
+        drawn = self.regions.get(name)
+
+        if drawn is None or drawn[0] != content:
+            self.add(rect)
+
+            if drawn:
+                self.add(drawn[1])
+
+        self.regions[name] = (content, pygame.Rect(rect))
+
+    def update(self):
+        if self.full or constants.DISPLAY_FULL_FLIP:
+            pygame.display.flip()
+
+        elif self.rects:
+            pygame.display.update(self.rects)
+
+        self.rects = []
+        self.full = False
+
 
 class obj_Assets:
     def __init__(self):
@@ -397,33 +1577,36 @@ class obj_Assets:
             'aa', 0, 32, 32, 2, (32, 32))
 
         ## SPRITES ##
-        self.S_WALL = pygame.image.load("assets/Wall2.jpg")
+        self.S_WALL = self.image_load("assets/Wall2.jpg")
         self.S_FLOOR = self.environmentsheet.get_image(
             'a', 16, 16, 16, (32, 32))[0]
         self.S_FLOOREXPLORED = self.environmentsheet.get_image(
             'a', 1, 16, 16, (32, 32))[0]
-        self.S_WALLEXPLORED = pygame.image.load("assets/WallUnseen.png")
-        self.S_SKULL = [pygame.image.load("assets/Skull.png")]
+        self.S_WALLEXPLORED = self.image_load("assets/WallUnseen.png")
+        self.S_SKULL = [self.image_load("assets/Skull.png")]
 
         ## ITEMS ##
-        self.S_SWORD = [pygame.transform.scale(
-            pygame.image.load("assets/Sword.png"), (constants.CELL_WIDTH, constants.CELL_HEIGHT))]
-        self.S_SHIELD = [pygame.transform.scale(pygame.image.load(
-            "assets/Shield.png"), (constants.CELL_WIDTH, constants.CELL_HEIGHT))]
-        self.S_SCROLL_01 = pygame.image.load("assets/Scroll.png")
-        self.S_SCROLL_02 = pygame.image.load("assets/Scroll.png")
-        self.S_SCROLL_03 = pygame.image.load("assets/Scroll.png")
-        self.S_LAMP = pygame.image.load("assets/Lamp.png")
+        self.S_SWORD = [self.image_load("assets/Sword.png")]
+        self.S_SHIELD = [self.image_load("assets/Shield.png")]
+        self.S_SCROLL_01 = self.image_load("assets/Scroll.png")
+        self.S_SCROLL_02 = self.image_load("assets/Scroll.png")
+        self.S_SCROLL_03 = self.image_load("assets/Scroll.png")
+        self.S_LAMP = self.image_load("assets/Lamp.png")
 
         ## SPECIAL ##
-        self.S_UPSTAIRS = [pygame.image.load("assets/Upstairs.png")]
-        self.S_DOWNSTAIRS = [pygame.image.load("assets/Downstairs.png")]
-        self.MAIN_MENU_BG = pygame.image.load("assets/Live Python.jpg")
-        self.S_DOOR_OPEN = [pygame.image.load("assets/DoorOpen.png")]
-        self.S_DOOR_CLOSE = [pygame.image.load("assets/DoorClose.png")]
+        self.S_UPSTAIRS = [self.image_load("assets/Upstairs.png")]
+        self.S_DOWNSTAIRS = [self.image_load("assets/Downstairs.png")]
+        self.MAIN_MENU_BG = self.image_load("assets/Live Python.jpg", size=None)
+        self.S_DOOR_OPEN = [self.image_load("assets/DoorOpen.png")]
+        self.S_DOOR_CLOSE = [self.image_load("assets/DoorClose.png")]
         # self.MAIN_MENU_BG = pygame.transform.scale(
         # self.MAIN_MENU_BG, (constants.CAMERA_WIDTH, constants.CAMERA_HEIGHT))
 
+        # Unexplored tiles, and what's under the see-through bits of a tile
+        self.S_BACKGROUND = pygame.Surface(
+            (constants.CELL_WIDTH, constants.CELL_HEIGHT)).convert()
+        self.S_BACKGROUND.fill(constants.COLOR_DEFAULT_BG)
+
         self.animation_dict = {
             ## ANIMATIONS ##
             "A_PLAYER": self.A_PLAYER,
@@ -450,6 +1633,30 @@ class obj_Assets:
 
         }
 
+        ## OVERLAYS ##
+        self.tile_overlays = {}
+
+        # menu_tile_select's cursor, the path to it and an area of effect
+        self.tile_overlay(constants.COLOR_WHITE, 200, "X")
+        self.tile_overlay(constants.COLOR_WHITE, 200)
+        self.tile_overlay(constants.COLOR_RED, 150)
+
+        ## ATLAS ##
+        tile_sprites = [self.S_BACKGROUND, self.S_WALL, self.S_FLOOR,
+                        self.S_WALLEXPLORED, self.S_FLOOREXPLORED]
+
+        map_sprites = tile_sprites + [
+            sprite for animation in self.animation_dict.values()
+            for sprite in animation]
+
+        # The map is drawn in cells, anything else would overlap or leave gaps
+        for sprite in map_sprites:
+            if sprite.get_size() != (constants.CELL_WIDTH, constants.CELL_HEIGHT):
+                raise ValueError("sprite is {}x{}, cells are {}x{}".format(
+                    *sprite.get_size(), constants.CELL_WIDTH, constants.CELL_HEIGHT))
+
+        self.atlas = obj_SpriteAtlas(map_sprites)
+
         #########
         # AUDIO
         #########
@@ -465,6 +1672,40 @@ class obj_Assets:
         # Sounds for Player strike
         self.snd_list_hit = [self.sound_hit_1, self.sound_hit_2]
 
+    def tile_overlay(self, color, alpha, mark=None):
+        ''' A see-through tile, for marking tiles on the map, made once per
+        color, alpha and mark '''
+        overlay_key = (color, alpha, mark)
+
+        if overlay_key not in self.tile_overlays:
+            new_surface = pygame.Surface(
+                (constants.CELL_WIDTH, constants.CELL_HEIGHT)).convert()
+
+            new_surface.fill(color)
+
+            new_surface.set_alpha(alpha)  # setting opacity
+
+            if mark:
+                draw_text(new_surface, mark, font=constants.FONT_CURSOR_TEXT, T_coords=(
+                    constants.CELL_WIDTH/2, constants.CELL_HEIGHT/2), text_color=constants.COLOR_BLACK, center=True)
+
+            self.tile_overlays[overlay_key] = new_surface
+
+        return self.tile_overlays[overlay_key]
+
+    def image_load(self, file_name, size=(constants.CELL_WIDTH, constants.CELL_HEIGHT)):
+        ''' Loads an image scaled to size, in the display's pixel format, so
+        drawing it needs neither a scale nor a conversion '''
+        image = pygame.image.load(file_name)
+
+        if size and image.get_size() != size:
+            image = pygame.transform.scale(image, size)
+
+        if image.get_flags() & pygame.SRCALPHA:
+            return image.convert_alpha()
+
+        return image.convert()
+
     def sound_add(self, file_address):
 
         new_sound = pygame.mixer.Sound(file_address)
@@ -489,6 +1730,9 @@ class obj_Assets:
 class com_Creature:
     '''Creatures have health, can damage other objects by attacking, and can die'''
 
+    __slots__ = ("name_instance", "base_atk", "base_def", "current_hp",
+                 "max_hp", "death_function", "modifiers", "stats", "owner")
+
     def __init__(self, name_instance, base_atk=2, base_def=0, hp=10, death_function=None):
         self.name_instance = name_instance
         self.base_atk = base_atk
@@ -497,10 +1741,18 @@ class com_Creature:
         self.max_hp = hp
         self.death_function = death_function
 
+        # Buffs and debuffs: functions that change a stats dict in place,
+        # run in order after the equipment bonuses are added. A tuple, as
+        # most creatures never get any
+        self.modifiers = ()
+
+        # The stats last worked out, see stats_get
+        self.stats = None
+
     def move(self, dx, dy):
 
-        tile_is_wall = (GAME.current_map[self.owner.x + dx]
-                        [self.owner.y + dy].block_path == True)
+        tile_is_wall = GAME.current_map.block_path[self.owner.x + dx,
+                                                   self.owner.y + dy]
         target = map_check_for_creatures(
             self.owner.x + dx, self.owner.y + dy, self.owner)
 
@@ -508,8 +1760,8 @@ class com_Creature:
             self.attack(target)
 
         if not tile_is_wall and not target:
-            self.owner.x += dx
-            self.owner.y += dy
+            GAME.current_objects.move(
+                self.owner, self.owner.x + dx, self.owner.y + dy)
 
     def attack(self, target):
         damage_dealt = self.power - target.creature.defense
@@ -538,36 +1790,57 @@ class com_Creature:
 
     @property
     def power(self):
+        return self.stats_get()["attack"]
+
+    @property
+    def defense(self):
+        return self.stats_get()["defense"]
 
-        total_power = self.base_atk
+    def stats_get(self):
+        ''' The stats with equipment and modifiers applied. Only worked out
+        again after stats_invalidate, or when a base stat has changed '''
+        stats = self.stats
+
+        if (stats is None or stats["base_atk"] != self.base_atk
+                or stats["base_def"] != self.base_def):
+            stats = self.stats = self.stats_calculate()
+
+        return stats
+
+    def stats_calculate(self):
+        stats = {"base_atk": self.base_atk, "base_def": self.base_def,
+                 "attack": self.base_atk, "defense": self.base_def}
 
         if self.owner.container:
-            object_bonuses = [
-                obj.equipment.attack_bonus for obj in self.owner.container.equipped_items]
+            for obj in self.owner.container.equipped_items:
+                if obj.equipment.attack_bonus:
+                    stats["attack"] += obj.equipment.attack_bonus
 
-            for bonus in object_bonuses:
-                if bonus:
-                    total_power += bonus
+                if obj.equipment.defense_bonus:
+                    stats["defense"] += obj.equipment.defense_bonus
 
-        return total_power
+        for modifier in self.modifiers:
+            modifier(stats)
 
-    @property
-    def defense(self):
+        return stats
 
-        total_defense = self.base_def
+    def stats_invalidate(self):
+        self.stats = None
 
-        if self.owner.container:
-            object_bonuses = [
-                obj.equipment.defense_bonus for obj in self.owner.container.equipped_items]
+    def modifier_add(self, modifier):
+        self.modifiers += (modifier,)
+        self.stats_invalidate()
 
-            for bonus in object_bonuses:
-                if bonus:
-                    total_defense += bonus
+    def modifier_remove(self, modifier):
+        i = self.modifiers.index(modifier)
 
-        return total_defense
+        self.modifiers = self.modifiers[:i] + self.modifiers[i + 1:]
+        self.stats_invalidate()
 
 
 class com_Container:
+    __slots__ = ("inventory", "max_volume", "owner")
+
     def __init__(self, volume=10.0, inventory=None):
         self.inventory = inventory
         self.max_volume = volume
@@ -590,10 +1863,18 @@ class com_Container:
 
         return list_of_equipped_items
 
+    def changed(self):
+        ''' Call when the inventory, or what is equipped in it, changes '''
+        if self.owner.creature:
+            self.owner.creature.stats_invalidate()
+
     # TODO Get the weight of everything in inventory
 
 
 class com_Item:
+    __slots__ = ("weight", "volume", "use_function", "value",
+                 "current_container", "owner")
+
     def __init__(self, weight=0.0, volume=0.0,
                  use_function=None,
                  value=None):
@@ -612,6 +1893,7 @@ class com_Item:
             else:
                 game_message("Picking up", constants.COLOR_GREEN)
                 actor.container.inventory.append(self.owner)
+                actor.container.changed()
 
                 self.owner.animation_destroy()
 
@@ -619,13 +1901,16 @@ class com_Item:
                 self.current_container = actor.container
 
     def drop(self, new_x, new_y):
+        self.owner.x = new_x
+        self.owner.y = new_y
+
         GAME.current_objects.append(self.owner)
 
         self.owner.animation_init()
 
         self.current_container.inventory.remove(self.owner)
-        self.owner.x = new_x
-        self.owner.y = new_y
+        self.current_container.changed()
+        self.current_container = None
         game_message("Item dropped", constants.COLOR_GREY)
 
     def use(self):
@@ -643,9 +1928,12 @@ class com_Item:
 
             else:
                 self.current_container.inventory.remove(self.owner)
+                self.current_container.changed()
 
 
 class com_Equipment:
+    __slots__ = ("attack_bonus", "defense_bonus", "slot", "equipped", "owner")
+
     def __init__(self, attack_bonus=None, defense_bonus=None, slot=None):
         self.attack_bonus = attack_bonus
         self.defense_bonus = defense_bonus
@@ -672,16 +1960,19 @@ class com_Equipment:
                     return
 
         self.equipped = True
+        self.owner.item.current_container.changed()
         game_message("Item equipped")
 
     def unequip(self):
 
         # Toggle self.equipped
         self.equipped = False
+        self.owner.item.current_container.changed()
         game_message("Item unequipped")
 
 
 class com_Stairs:
+    __slots__ = ("downwards", "owner")
 
     def __init__(self, downwards=True):
 
@@ -695,6 +1986,8 @@ class com_Stairs:
 
 
 class com_ExitPortal:
+    __slots__ = ("OPEN", "CLOSE", "owner")
+
     def __init__(self):
         self.OPEN = "S_DOOR_OPEN"
         self.CLOSE = "S_DOOR_CLOSE"
@@ -710,104 +2003,409 @@ class com_ExitPortal:
             if obj.name_object is "THE LAMP":
                 found_lamp = True
 
-        if found_lamp and not portal_open:
-            self.owner.state = "OPEN"
-            self.owner.animation_key = "S_DOOR_OPEN"
-            self.owner.animation_init()
+        if found_lamp and not portal_open:
+            self.owner.state = "OPEN"
+            self.owner.animation_key = "S_DOOR_OPEN"
+            self.owner.animation_init()
+
+        if not found_lamp and portal_open:
+            self.owner.state = "CLOSED"
+            self.owner.animation_key = "S_DOOR_CLOSE"
+            self.owner.animation_init()
+
+    def use(self):
+
+        if self.owner.state == "OPEN":
+
+            PLAYER.state = "STATUS_WIN"
+
+            SURFACE_MAIN.fill(constants.COLOR_WHITE)
+
+            screen_center = (constants.CAMERA_WIDTH/2,
+                             constants.CAMERA_HEIGHT/2)
+
+            draw_text(SURFACE_MAIN, "YOU WON!", constants.FONT_TITLE_SCREEN,
+                      screen_center, constants.COLOR_BLACK, center=True)
+
+            pygame.display.update()
+
+            filename = ("savedata/win_" + PLAYER.creature.name_instance + "." +
+                        datetime.date.today().strftime("%Y%B%d") + ".txt")
+
+            file_exists = os.path.isfile(filename)
+            save_exists = os.path.isfile("assets/savegame")
+
+            if file_exists:
+                os.remove(filename)
+            if save_exists:
+                os.remove("assets/savegame")
+
+            # 'a+' will append an existing file, or create one if it doesn't exist
+            legacy_file = open(filename, 'a+')
+
+            for message, color in GAME.message_history:
+                legacy_file.write(message + "\n")
+
+            if not constants.HEADLESS:
+                pygame.time.wait(4000)
+
+
+##############################################################################
+# AI
+##############################################################################
+
+
+class ai_Confuse:
+    '''Once per turn, execute'''
+
+    __slots__ = ("old_ai", "num_turns", "owner")
+
+    def __init__(self, old_ai, num_turns):
+        self.old_ai = old_ai
+        self.num_turns = num_turns
+
+    def take_turn(self):
+
+        if self.num_turns > 0:
+            self.owner.creature.move(libtcodpy.random_get_int(0, -1, 1),
+                                     libtcodpy.random_get_int(0, -1, 1))
+
+            self.num_turns -= 1
+
+        else:
+            GAME.current_objects.component_change(
+                self.owner, "ai", self.old_ai)
+
+            game_message(self.owner.display_name +
+                         " has broken free!", constants.COLOR_RED)
+
+
+class ai_Chase:
+    ''' A basic monster ai which chases and tries to harm player.'''
+
+    __slots__ = ("owner",)
+
+    def take_turn(self):
+        monster = self.owner
+
+        if map_is_visible(monster.x, monster.y):
+
+            # TODO Move towards the player if far away
+            if monster.distance_to(PLAYER) >= 2:
+                self.owner.move_towards(PLAYER)
+
+            # TODO If close enough, attack player
+            elif PLAYER.creature.current_hp > 0:
+                monster.creature.attack(PLAYER)
+
+
+class ai_Flee:
+    __slots__ = ("owner",)
+
+    def take_turn(self):
+        monster = self.owner
+
+        if map_is_visible(monster.x, monster.y):
+
+            self.owner.move_away(PLAYER)
+
+
+##############################################################################
+# ENTITIES
+##############################################################################
+
+
+class struc_EntityStore:
+    '''Actors kept as rows of parallel arrays, one array per hot field,
+    instead of an obj_Actor and a handful of component objects each.
+    Rows are handed out as struc_Entity views, which work wherever an
+    obj_Actor does, and whole-level systems can work on the arrays.
+
+    Opt-in: the generators still build obj_Actors, and nothing in the
+    game, the turn loop included, makes a store yet'''
+
+    # Per-entity fields: name --> (dtype, initial value)
+    entity_fields = {"x": (np.int32, 0),
+                     "y": (np.int32, 0),
+                     "hp": (np.int32, 0),
+                     "max_hp": (np.int32, 0),
+                     "base_atk": (np.int32, 0),
+                     "base_def": (np.int32, 0),
+                     "depth": (np.int16, 0),
+                     "animation": (np.int32, 0),
+                     "animation_phase": (np.int64, 0),
+                     "flags": (np.uint8, 0)}
+
+    # Per-entity fields that are Python objects, kept in lists
+    object_fields = ("name_object", "state", "spawn_id", "spawn_state",
+                     "name_instance", "death_function", "modifiers", "stats",
+                     "ai", "container", "item", "equipment", "stairs",
+                     "exitportal")
+
+    # A bit in flags for each component an entity has, and for used rows
+    component_flags = {name: 1 << i for i, name in enumerate(
+        ("creature", "ai", "container", "item", "equipment", "stairs", "exitportal"))}
+    live_flag = 1 << 7
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.count = 0  # rows ever used; freed ones are reused first
+        self.free = []
+
+        for name, (dtype, fill) in self.entity_fields.items():
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+
+        for name in self.object_fields:
+            setattr(self, name, [])
+
+        # The view of each row, so an entity is always the same object
+        self.views = []
+
+        # animation index --> (animation key, animation speed), and back
+        self.animation_ids = []
+        self.animation_index = {}
+
+    def __len__(self):
+        return self.count - len(self.free)
+
+    def add(self, actor):
+        ''' Moves an actor, as the gen_* functions build them, into a row.
+        Returns the struc_Entity to use in its place from then on '''
+        if self.free:
+            row = self.free.pop()
+
+        else:
+            row = self.count
+
+            if row == self.capacity:
+                self.grow()
+
+            self.count += 1
+
+            for name in self.object_fields:
+                getattr(self, name).append(None)
+
+            self.views.append(None)
+
+        entity = struc_Entity(self, row)
+        self.views[row] = entity
+        self.flags[row] = self.live_flag
+
+        self.animation[row] = self.animation_id_index(actor.animation_id)
+
+        for name in ("x", "y", "depth", "animation_phase", "name_object",
+                     "state", "spawn_id", "spawn_state"):
+            setattr(entity, name, getattr(actor, name))
+
+        # Components last, as they are pointed at the entity as they go
+        for name in self.component_flags:
+            setattr(entity, name, getattr(actor, name))
+
+        return entity
+
+    def remove(self, entity):
+        row = entity.row
+
+        self.flags[row] = 0
+        self.views[row] = None
+
+        for name in self.object_fields:
+            getattr(self, name)[row] = None
+
+        self.free.append(row)
+
+    def grow(self):
+        self.capacity *= 2
+
+        for name, (dtype, fill) in self.entity_fields.items():
+            column = np.full(self.capacity, fill, dtype=dtype)
+            column[:self.count] = getattr(self, name)[:self.count]
+
+            setattr(self, name, column)
+
+    def rows_in_view(self, x1, y1, x2, y2, visible):
+        ''' The rows of the entities inside a rect of the map and visible,
+        visible being the FOV of that rect, like map_visible_window's.
+        Carried entities keep their last x, y, so they are counted too '''
+        x = self.x[:self.count]
+        y = self.y[:self.count]
+
+        rows = np.flatnonzero((self.flags[:self.count] & self.live_flag != 0) &
+                              (x >= x1) & (x < x2) & (y >= y1) & (y < y2))
+
+        return rows[visible[x[rows] - x1, y[rows] - y1]]
+
+    def animation_id_index(self, animation_id):
+        if animation_id not in self.animation_index:
+            self.animation_index[animation_id] = len(self.animation_ids)
+            self.animation_ids.append(animation_id)
+
+        return self.animation_index[animation_id]
+
+    @staticmethod
+    def field(column):
+        ''' A property reading and writing one of the entity arrays '''
+        def get(self):
+            return getattr(self.store, column)[self.row].item()
+
+        def set(self, value):
+            getattr(self.store, column)[self.row] = value
+
+        return property(get, set)
 
-        if not found_lamp and portal_open:
-            self.owner.state = "CLOSED"
-            self.owner.animation_key = "S_DOOR_CLOSE"
-            self.owner.animation_init()
+    @staticmethod
+    def object_field(name):
+        ''' A property reading and writing one of the object lists '''
+        def get(self):
+            return getattr(self.store, name)[self.row]
 
-    def use(self):
+        def set(self, value):
+            getattr(self.store, name)[self.row] = value
 
-        if self.owner.state == "OPEN":
+        return property(get, set)
 
-            PLAYER.state = "STATUS_WIN"
+    @staticmethod
+    def component(name):
+        ''' A component property, which also keeps the flags up to date '''
+        flag = struc_EntityStore.component_flags[name]
 
-            SURFACE_MAIN.fill(constants.COLOR_WHITE)
+        def get(self):
+            return getattr(self.store, name)[self.row]
 
-            screen_center = (constants.CAMERA_WIDTH/2,
-                             constants.CAMERA_HEIGHT/2)
+        def set(self, value):
+            getattr(self.store, name)[self.row] = value
 
-            draw_text(SURFACE_MAIN, "YOU WON!", constants.FONT_TITLE_SCREEN,
-                      screen_center, constants.COLOR_BLACK, center=True)
+            if value:
+                self.store.flags[self.row] |= flag
+                value.owner = self
+            else:
+                self.store.flags[self.row] &= 0xFF ^ flag
 
-            pygame.display.update()
+        return property(get, set)
 
-            filename = ("savedata/win_" + PLAYER.creature.name_instance + "." +
-                        datetime.date.today().strftime("%Y%B%d") + ".txt")
 
-            file_exists = os.path.isfile(filename)
-            save_exists = os.path.isfile("assets/savegame")
+class struc_Entity:
+    '''An obj_Actor kept in a struc_EntityStore, read and written through
+    the store's arrays'''
 
-            if file_exists:
-                os.remove(filename)
-            if save_exists:
-                os.remove("assets/savegame")
+    __slots__ = ("store", "row")
 
-            # 'a+' will append an existing file, or create one if it doesn't exist
-            legacy_file = open(filename, 'a+')
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
 
-            for message, color in GAME.message_history:
-                legacy_file.write(message + "\n")
+    x = struc_EntityStore.field("x")
+    y = struc_EntityStore.field("y")
+    depth = struc_EntityStore.field("depth")
+    animation_phase = struc_EntityStore.field("animation_phase")
 
-            pygame.time.wait(4000)
+    name_object = struc_EntityStore.object_field("name_object")
+    state = struc_EntityStore.object_field("state")
+    spawn_id = struc_EntityStore.object_field("spawn_id")
+    spawn_state = struc_EntityStore.object_field("spawn_state")
 
+    ai = struc_EntityStore.component("ai")
+    container = struc_EntityStore.component("container")
+    item = struc_EntityStore.component("item")
+    equipment = struc_EntityStore.component("equipment")
+    stairs = struc_EntityStore.component("stairs")
+    exitportal = struc_EntityStore.component("exitportal")
 
-##############################################################################
-# AI
-##############################################################################
+    @property
+    def animation_id(self):
+        return self.store.animation_ids[self.store.animation[self.row]]
 
+    @property
+    def animation_key(self):
+        return self.animation_id[0]
 
-class ai_Confuse:
-    '''Once per turn, execute'''
+    @animation_key.setter
+    def animation_key(self, animation_key):
+        self.store.animation[self.row] = self.store.animation_id_index(
+            (animation_key, self.animation_speed))
 
-    def __init__(self, old_ai, num_turns):
-        self.old_ai = old_ai
-        self.num_turns = num_turns
+    @property
+    def animation_speed(self):
+        return self.animation_id[1]
 
-    def take_turn(self):
+    @animation_speed.setter
+    def animation_speed(self, animation_speed):
+        self.store.animation[self.row] = self.store.animation_id_index(
+            (self.animation_key, animation_speed))
 
-        if self.num_turns > 0:
-            self.owner.creature.move(libtcodpy.random_get_int(0, -1, 1),
-                                     libtcodpy.random_get_int(0, -1, 1))
+    @property
+    def animation(self):
+        # Looked up each time, so there are no surfaces to drop for saving
+        return ASSETS.animation_dict[self.animation_key]
 
-            self.num_turns -= 1
+    @property
+    def creature(self):
+        if self.store.flags[self.row] & struc_EntityStore.component_flags["creature"]:
+            return struc_EntityCreature(self.store, self.row)
 
-        else:
-            self.owner.ai = self.old_ai
+    @creature.setter
+    def creature(self, creature):
+        flag = struc_EntityStore.component_flags["creature"]
 
-            game_message(self.owner.display_name +
-                         " has broken free!", constants.COLOR_RED)
+        if not creature:
+            self.store.flags[self.row] &= 0xFF ^ flag
+            return
 
+        self.store.flags[self.row] |= flag
 
-class ai_Chase:
-    ''' A basic monster ai which chases and tries to harm player.'''
+        entity_creature = struc_EntityCreature(self.store, self.row)
 
-    def take_turn(self):
-        monster = self.owner
+        for name in ("name_instance", "base_atk", "base_def", "current_hp",
+                     "max_hp", "death_function", "modifiers", "stats"):
+            setattr(entity_creature, name, getattr(creature, name))
 
-        if libtcodpy.map_is_in_fov(FOV_MAP, monster.x, monster.y):
+    display_name = obj_Actor.display_name
+    draw = obj_Actor.draw
+    distance_to = obj_Actor.distance_to
+    move_towards = obj_Actor.move_towards
+    move_away = obj_Actor.move_away
 
-            # TODO Move towards the player if far away
-            if monster.distance_to(PLAYER) >= 2:
-                self.owner.move_towards(PLAYER)
+    def animation_destroy(self):
+        pass
 
-            # TODO If close enough, attack player
-            elif PLAYER.creature.current_hp > 0:
-                monster.creature.attack(PLAYER)
+    def animation_init(self):
+        pass
 
 
-class ai_Flee:
+class struc_EntityCreature:
+    '''The com_Creature of a struc_Entity, kept in the store's arrays'''
 
-    def take_turn(self):
-        monster = self.owner
+    __slots__ = ("store", "row")
 
-        if libtcodpy.map_is_in_fov(FOV_MAP, monster.x, monster.y):
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
 
-            self.owner.move_away(PLAYER)
+    name_instance = struc_EntityStore.object_field("name_instance")
+    death_function = struc_EntityStore.object_field("death_function")
+    modifiers = struc_EntityStore.object_field("modifiers")
+    stats = struc_EntityStore.object_field("stats")
+
+    current_hp = struc_EntityStore.field("hp")
+    max_hp = struc_EntityStore.field("max_hp")
+    base_atk = struc_EntityStore.field("base_atk")
+    base_def = struc_EntityStore.field("base_def")
+
+    @property
+    def owner(self):
+        return self.store.views[self.row]
+
+    move = com_Creature.move
+    attack = com_Creature.attack
+    take_damage = com_Creature.take_damage
+    heal = com_Creature.heal
+    power = com_Creature.power
+    defense = com_Creature.defense
+    stats_get = com_Creature.stats_get
+    stats_calculate = com_Creature.stats_calculate
+    stats_invalidate = com_Creature.stats_invalidate
+    modifier_add = com_Creature.modifier_add
+    modifier_remove = com_Creature.modifier_remove
 
 
 ##############################################################################
@@ -821,21 +2419,21 @@ def death_monster(monster):
     game_message(monster.creature.name_instance +
                  " is dead!", constants.COLOR_GREY)
 
-    monster.animation = ASSETS.S_SKULL
     monster.animation_key = "S_SKULL"
-    monster.depth = constants.DEPTH_CORPSE
+    monster.animation_init()
+    GAME.current_objects.depth_change(monster, constants.DEPTH_CORPSE)
     monster.creature = None
-    monster.ai = None
+    GAME.current_objects.component_change(monster, "ai", None)
 
 
 def death_mouse(mouse):
     game_message(mouse.creature.name_instance +
                  " is dead! Eat him!", constants.COLOR_GREEN)
 
-    mouse.animation = ASSETS.S_SKULL
     mouse.animation_key = "S_SKULL"
+    mouse.animation_init()
     mouse.creature = None
-    mouse.ai = None
+    GAME.current_objects.component_change(mouse, "ai", None)
 
 
 def death_player(player):
@@ -867,7 +2465,8 @@ def death_player(player):
     for message, color in GAME.message_history:
         legacy_file.write(message + "\n")
 
-    pygame.time.wait(4000)
+    if not constants.HEADLESS:
+        pygame.time.wait(4000)
 
 
 ##############################################################################
@@ -875,36 +2474,45 @@ def death_player(player):
 ##############################################################################
 
 
-def map_create():
+def map_create(seed=None, width=constants.MAP_WIDTH, height=constants.MAP_HEIGHT,
+               num_rooms=constants.MAP_MAX_NUM_ROOMS):
+    rng = helper_rng(seed)
+
     # Generate a map full of walls
-    new_map = [[struc_Tile(True) for y in range(0, constants.MAP_HEIGHT)]
-               for x in range(0, constants.MAP_WIDTH)]
+    new_map = struc_Map(width, height)
     # Generate new room
     list_of_rooms = []
 
-    for i in range(constants.MAP_MAX_NUM_ROOMS):
+    # Cells covered by a placed room, so a candidate is checked against
+    # its own footprint instead of against every other room
+    room_cells = np.zeros((width, height), dtype=np.bool_)
+
+    for i in range(num_rooms):
 
         w = libtcodpy.random_get_int(
-            0, constants.ROOM_MIN_WIDTH, constants.ROOM_MAX_WIDTH)
+            rng, constants.ROOM_MIN_WIDTH, constants.ROOM_MAX_WIDTH)
         h = libtcodpy.random_get_int(
-            0, constants.ROOM_MIN_HEIGHT, constants.ROOM_MAX_HEIGHT)
+            rng, constants.ROOM_MIN_HEIGHT, constants.ROOM_MAX_HEIGHT)
 
-        x = libtcodpy.random_get_int(0, 2, constants.MAP_WIDTH - w - 2)
-        y = libtcodpy.random_get_int(0, 2, constants.MAP_HEIGHT - h - 2)
+        x = libtcodpy.random_get_int(rng, 2, width - w - 2)
+        y = libtcodpy.random_get_int(rng, 2, height - h - 2)
 
         # Create the room
         new_room = obj_Room((x, y), (w, h))
 
-        failed = False
+        new_map.room_attempts += 1
 
-        # Check for intersect
-        for other_room in list_of_rooms:
-            if new_room.intersect(other_room):
-                failed = True
-                break
+        # Check for intersect, edges included like obj_Room.intersect
+        footprint = (slice(new_room.x1, new_room.x2 + 1),
+                     slice(new_room.y1, new_room.y2 + 1))
 
-        if not failed:
+        if room_cells[footprint].any():
+            new_map.room_rejections += 1
+
+        else:
             # Place the room
+            room_cells[footprint] = True
+
             map_create_room(new_map, new_room)
             current_center = new_room.center
 
@@ -912,18 +2520,20 @@ def map_create():
                 previous_center = list_of_rooms[-1].center
 
                 # Dig the tunnels
-                map_create_tunnels(current_center, previous_center, new_map)
+                map_create_tunnels(
+                    current_center, previous_center, new_map, rng)
 
             list_of_rooms.append(new_room)
 
-    map_make_fov(new_map)
-
     return (new_map, list_of_rooms)
 
 
-def map_place_objects(room_list):
+def map_place_objects(room_list, seed=None):
+    rng = helper_rng(seed)
 
-    current_level = len(GAME.maps_previous) + 1
+    current_level = GAME.depth
+
+    first_spawn = len(GAME.current_objects)
 
     top_level = (current_level == 1)
 
@@ -935,7 +2545,7 @@ def map_place_objects(room_list):
         last_room = (room == room_list[-1])
 
         if first_room:
-            PLAYER.x, PLAYER.y = room.center
+            GAME.current_objects.move(PLAYER, *room.center)
 
         if first_room and top_level:
             gen_portal(room.center)
@@ -949,89 +2559,258 @@ def map_place_objects(room_list):
             else:
                 gen_stairs(room.center)
 
-        x = libtcodpy.random_get_int(0, room.x1 + 1, room.x2 - 1)
-        y = libtcodpy.random_get_int(0, room.y1 + 1, room.y2 - 1)
+        map_place_room_objects(room, rng)
+
+    # Tag what this level spawned with so a rebuild can tell what changed
+    for spawn_number, obj in enumerate(GAME.current_objects[first_spawn:]):
+        obj.spawn_id = (current_level, spawn_number)
+        obj.spawn_state = helper_actor_state(obj)
+
+
+def map_place_room_objects(room, rng=0):
+
+    x = libtcodpy.random_get_int(rng, room.x1 + 1, room.x2 - 1)
+    y = libtcodpy.random_get_int(rng, room.y1 + 1, room.y2 - 1)
+
+    gen_enemy((x, y), rng)
+
+    x = libtcodpy.random_get_int(rng, room.x1 + 1, room.x2 - 1)
+    y = libtcodpy.random_get_int(rng, room.y1 + 1, room.y2 - 1)
+
+    gen_item((x, y), rng)
+
+
+def map_create_level(seed=None):
+    if constants.MAP_CHUNKED:
+        return map_create_chunked(seed)
+
+    return map_create(seed)
+
+
+def map_create_chunked(seed=None):
+    if seed is None:
+        seed = libtcodpy.random_get_int(0, 0, 0x7FFFFFFF)
+
+    new_map = struc_ChunkedMap(
+        constants.MAP_CHUNKED_WIDTH, constants.MAP_CHUNKED_HEIGHT, seed)
+
+    # The level starts in the middle chunk, whose rooms get the usual
+    # player, stairs and objects from map_place_objects
+    new_map.chunk(new_map.chunks_x // 2, new_map.chunks_y // 2)
+
+    return (new_map, new_map.take_new_rooms())
+
+
+def map_create_chunk(seed, chunk_size, open_edges):
+    ''' Builds one chunk, with corridors out to each neighbouring chunk '''
+    new_map, list_of_rooms = map_create(
+        seed, chunk_size, chunk_size, constants.MAP_CHUNK_NUM_ROOMS)
 
-        gen_enemy((x, y))
+    middle = chunk_size // 2
+    open_left, open_right, open_top, open_bottom = open_edges
 
-        x = libtcodpy.random_get_int(0, room.x1 + 1, room.x2 - 1)
-        y = libtcodpy.random_get_int(0, room.y1 + 1, room.y2 - 1)
+    # Every chunk crosses at its middle, so neighbours always meet up
+    new_map.block_path[0 if open_left else middle:
+                       chunk_size if open_right else middle + 1, middle] = False
+    new_map.block_path[middle, 0 if open_top else middle:
+                       chunk_size if open_bottom else middle + 1] = False
 
-        gen_item((x, y))
+    if list_of_rooms:
+        map_create_tunnels(list_of_rooms[-1].center, (middle, middle),
+                           new_map, helper_rng(seed))
+
+    return (new_map, list_of_rooms)
+
+
+def map_update_chunks():
+    ''' Populates newly made chunks, compresses ones far from the player.
+    Centred on the player, as the camera only catches up when drawn '''
+    current_map = GAME.current_map
+
+    if not current_map.chunked:
+        return
+
+    current_map.update(PLAYER.x, PLAYER.y)
+
+    # Each chunk's objects come from its own seed, like its tiles
+    chunk_rngs = {}
+
+    for room in current_map.take_new_rooms():
+        chunk_coords = (room.x1 // current_map.chunk_size,
+                        room.y1 // current_map.chunk_size)
+
+        if chunk_coords not in chunk_rngs:
+            chunk_rngs[chunk_coords] = helper_rng(
+                current_map.chunk_seed(*chunk_coords, stream="objects"))
+
+        map_place_room_objects(room, chunk_rngs[chunk_coords])
 
 
 def map_create_room(new_map, new_room):
 
-    for x in range(new_room.x1, new_room.x2):
-        for y in range(new_room.y1, new_room.y2):
-            new_map[x][y].block_path = False
+    new_map.block_path[new_room.x1:new_room.x2,
+                       new_room.y1:new_room.y2] = False
 
 
-def map_create_tunnels(coords1, coords2, new_map):
+def map_create_tunnels(coords1, coords2, new_map, rng=0):
     x1, y1 = coords1
     x2, y2 = coords2
 
-    coin_flip = (libtcodpy.random_get_int(0, 0, 1) == 1)
+    coin_flip = (libtcodpy.random_get_int(rng, 0, 1) == 1)
+
+    x_min, x_max = min(x1, x2), max(x1, x2) + 1
+    y_min, y_max = min(y1, y2), max(y1, y2) + 1
 
     if coin_flip:
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            new_map[x][y1].block_path = False
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            new_map[x2][y].block_path = False
+        new_map.block_path[x_min:x_max, y1] = False
+        new_map.block_path[x2, y_min:y_max] = False
     else:
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            new_map[x1][y].block_path = False
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            new_map[x][y2].block_path = False
+        new_map.block_path[x1, y_min:y_max] = False
+        new_map.block_path[x_min:x_max, y2] = False
 
 
 def map_check_for_creatures(x, y, exclude_object=None):
 
-    target = None
+    # check the tile's objects to find a creature that isn't excluded
+    for object in GAME.current_objects.at(x, y):
+        if object.creature and object is not exclude_object:
+            return object
+
+    return None
 
-    if exclude_object:
-        # check object list to find creature at location that isn't excluded
-        for object in GAME.current_objects:
-            if (object is not exclude_object and object.x == x and object.y == y and object.creature):
-                target = object
 
-            if target:
-                return target
+def map_make_fov(incoming_map):
+    global FOV_MAP, FOV_VISIBLE, FOV_WINDOW, FOV_CACHE
+
+    if incoming_map.chunked:
+        # Too big for one FOV map, lit from the tiles around the player
+        FOV_MAP = None
 
     else:
-        # check object list to find any creature at that location
-        for object in GAME.current_objects:
-            if(object.x == x and object.y == y and object.creature):
-                target = object
+        # Array-backed map in [x, y] order, filled in one step from the tiles
+        FOV_MAP = libtcodpy.map.Map(
+            incoming_map.width, incoming_map.height, order="F")
 
-            if target:
-                return target
+        FOV_MAP.transparent[:] = ~incoming_map.block_path
+        FOV_MAP.walkable[:] = ~incoming_map.block_path
 
+    # Last FOV result, for the FOV_WINDOW rect of the map that a torch
+    # can reach, and recent results by position
+    FOV_WINDOW = (0, 0, 0, 0)
+    FOV_VISIBLE = np.zeros((0, 0), dtype=np.bool_)
+    FOV_CACHE = collections.OrderedDict()
 
-def map_make_fov(incoming_map):
-    global FOV_MAP
 
-    FOV_MAP = libtcodpy.map_new(constants.MAP_WIDTH, constants.MAP_HEIGHT)
+def map_update_fov_tile(incoming_map, x, y):
+    ''' Copies a single changed tile into FOV_MAP instead of rebuilding it '''
+    if FOV_MAP is None:
+        return
 
-    for y in range(constants.MAP_HEIGHT):
-        for x in range(constants.MAP_WIDTH):
-            libtcodpy.map_set_properties(FOV_MAP, x, y,
-                                         not incoming_map[x][y].block_path, not incoming_map[x][y].block_path)
+    is_open = not incoming_map.block_path[x, y]
 
+    FOV_MAP.transparent[x, y] = is_open
+    FOV_MAP.walkable[x, y] = is_open
 
-def map_calculate_fov():
+
+def map_set_block_path(x, y, block_path, tile_map=None):
+    ''' Digs or fills one tile. Every change to a single tile goes through
+    here, so the map's version, and the FOV map if it's the current one,
+    keep up with it '''
     global FOV_CALCULATE
 
+    if tile_map is None:
+        tile_map = GAME.current_map
+
+    tile_map.block_path[x, y] = block_path
+    tile_map.version += 1
+
+    if tile_map is GAME.current_map:
+        map_update_fov_tile(tile_map, x, y)
+
+        FOV_CALCULATE = True
+
+
+def map_fov_window(x, y):
+    ''' The part of the map a torch at x, y can possibly light '''
+    radius = constants.TORCH_RADIUS
+    current_map = GAME.current_map
+
+    if radius <= 0 and not current_map.chunked:
+        return (0, 0, current_map.width, current_map.height)
+
+    if radius <= 0:
+        radius = current_map.chunk_size
+
+    return (max(x - radius, 0), max(y - radius, 0),
+            min(x + radius + 1, current_map.width), min(y + radius + 1, current_map.height))
+
+
+def map_calculate_fov():
+    global FOV_CALCULATE, FOV_WINDOW, FOV_VISIBLE
+
     if FOV_CALCULATE:
         FOV_CALCULATE = False
-        libtcodpy.map_compute_fov(
-            FOV_MAP, PLAYER.x, PLAYER.y, constants.TORCH_RADIUS, constants.FOV_LIGHT_WALLS, constants.FOV_ALGO)
+
+        fov_key = (PLAYER.x, PLAYER.y, GAME.current_map.version)
+
+        if fov_key in FOV_CACHE:
+            FOV_CACHE.move_to_end(fov_key)
+
+        else:
+            # Only the torch window can be lit, so that is all we keep
+            x1, y1, x2, y2 = map_fov_window(PLAYER.x, PLAYER.y)
+
+            if FOV_MAP is None:
+                transparent = ~GAME.current_map.block_path[x1:x2, y1:y2]
+
+                window_visible = libtcodpy.map.compute_fov(
+                    transparent, (PLAYER.x - x1, PLAYER.y - y1), constants.TORCH_RADIUS, constants.FOV_LIGHT_WALLS, constants.FOV_ALGO)
+
+            else:
+                libtcodpy.map_compute_fov(
+                    FOV_MAP, PLAYER.x, PLAYER.y, constants.TORCH_RADIUS, constants.FOV_LIGHT_WALLS, constants.FOV_ALGO)
+
+                window_visible = FOV_MAP.fov[x1:x2, y1:y2].copy()
+
+            FOV_CACHE[fov_key] = ((x1, y1, x2, y2), window_visible)
+
+            if len(FOV_CACHE) > constants.FOV_CACHE_SIZE:
+                FOV_CACHE.popitem(last=False)
+
+        FOV_WINDOW, FOV_VISIBLE = FOV_CACHE[fov_key]
+        x1, y1, x2, y2 = FOV_WINDOW
+
+        # Everything in view is now explored
+        GAME.current_map.explored[x1:x2, y1:y2] |= FOV_VISIBLE
+
+
+def map_is_visible(x, y):
+    ''' Reads the cached FOV result instead of asking libtcod per cell '''
+    x1, y1, x2, y2 = FOV_WINDOW
+
+    return x1 <= x < x2 and y1 <= y < y2 and FOV_VISIBLE[x - x1, y - y1]
+
+
+def map_visible_window(x1, y1, x2, y2):
+    ''' The cached FOV result for a rect of the map, as a [x, y] array '''
+    visible = np.zeros((x2 - x1, y2 - y1), dtype=np.bool_)
+
+    fov_x1, fov_y1, fov_x2, fov_y2 = FOV_WINDOW
+
+    overlap_x1, overlap_y1 = max(x1, fov_x1), max(y1, fov_y1)
+    overlap_x2, overlap_y2 = min(x2, fov_x2), min(y2, fov_y2)
+
+    if overlap_x1 < overlap_x2 and overlap_y1 < overlap_y2:
+        visible[overlap_x1 - x1:overlap_x2 - x1, overlap_y1 - y1:overlap_y2 - y1] = \
+            FOV_VISIBLE[overlap_x1 - fov_x1:overlap_x2 - fov_x1,
+                        overlap_y1 - fov_y1:overlap_y2 - fov_y1]
+
+    return visible
 
 
 def map_objects_at_coords(coords_x, coords_y):
 
-    object_options = [
-        obj for obj in GAME.current_objects if obj.x == coords_x and obj.y == coords_y]
+    object_options = list(GAME.current_objects.at(coords_x, coords_y))
 
     return object_options
 
@@ -1063,6 +2842,33 @@ def map_find_line(coords1, coords2):
     return coord_list
 
 
+def map_find_target(coords_origin, coords_target, max_range=None, penetrate_walls=True, pierce_creature=True):
+    ''' The tiles a shot from coords_origin at coords_target passes over,
+    stopping at max_range, and at walls and creatures unless it goes
+    through them. Without an origin, just the target tile '''
+    if not coords_origin:
+        return [coords_target]
+
+    valid_tiles = []
+
+    for i, (x, y) in enumerate(map_find_line(coords_origin, coords_target)):
+        valid_tiles.append((x, y))
+
+        # Stop at max range
+        if max_range and i == max_range - 1:
+            break
+
+        # Stop at wall
+        if not penetrate_walls and GAME.current_map.block_path[x, y]:
+            break
+
+        # Stop at creature
+        if not pierce_creature and map_check_for_creatures(x, y):
+            break
+
+    return valid_tiles
+
+
 def map_find_radius(coords, radius):
     center_x, center_y = coords
 
@@ -1087,20 +2893,19 @@ def map_find_radius(coords, radius):
 def draw_game():
     global SURFACE_MAIN
 
-    # clear the surface
-    SURFACE_MAIN.fill(constants.COLOR_DEFAULT_BG)
-    SURFACE_MAP.fill(constants.COLOR_DEFAULT_BG)
-
     CAMERA.update()
+    SCREEN_UPDATES.camera((CAMERA.x, CAMERA.y))
 
     # draw the map
     draw_map(GAME.current_map)
 
-    # draw all objects ---removed key=lambda obj: obj.depth
-    for obj in sorted(GAME.current_objects, key=lambda obj: obj.depth, reverse=True):
-        obj.draw()
+    # draw all objects, deepest first
+    draw_objects()
 
-    SURFACE_MAIN.blit(SURFACE_MAP, (0, 0), CAMERA.rectangle)
+    SCREEN_UPDATES.actors_done()
+
+    # The map surface is the camera's view, and covers the whole window
+    SURFACE_MAIN.blit(SURFACE_MAP, (0, 0))
 
     draw_debug()
     draw_messages()
@@ -1108,78 +2913,46 @@ def draw_game():
 
 def draw_map(map_to_draw):
 
-    cam_x, cam_y = CAMERA.map_address
-    display_map_w = constants.CAMERA_WIDTH / constants.CELL_WIDTH
-    display_map_h = constants.CAMERA_HEIGHT / constants.CELL_HEIGHT
-
-    render_w_min = math.floor(cam_x - (display_map_w / 2))
-    render_h_min = math.floor(cam_y - (display_map_h / 2))
-    render_w_max = math.floor(cam_x + (display_map_w / 2))
-    render_h_max = math.floor(cam_y + (display_map_h / 2))
-
-    if render_w_min < 0:
-        render_w_min = 0
-    if render_h_min < 0:
-        render_h_min = 0
-
-    if render_w_max > constants.MAP_WIDTH:
-        render_w_max = constants.MAP_WIDTH
-    if render_h_max > constants.MAP_HEIGHT:
-        render_h_max = constants.MAP_HEIGHT
+    # Bring the cached terrain up to date, then lay it under the actors
+    TERRAIN.update(map_to_draw)
+    TERRAIN.draw(SURFACE_MAP)
 
-    for x in range(render_w_min, render_w_max):
-        for y in range(render_h_min, render_h_max):
 
-            is_visible = libtcodpy.map_is_in_fov(FOV_MAP, x, y)
+def draw_objects():
+    ''' Draws the objects that are both on camera and in the player's view '''
+    ANIMATION_CLOCK.tick()
 
-            if is_visible:
+    fov_x1, fov_y1, fov_x2, fov_y2 = FOV_WINDOW
 
-                map_to_draw[x][y].explored = True
+    # The tiles draw_map laid down, cut down to the torch's reach
+    x1, y1 = TERRAIN.origin
+    x2, y2 = x1 + TERRAIN.width, y1 + TERRAIN.height
 
-                if map_to_draw[x][y].block_path == True:
-                    # draw wall
-                    SURFACE_MAP.blit(
-                        ASSETS.S_WALL, (x * constants.CELL_WIDTH, y * constants.CELL_HEIGHT))
-                else:
-                    # draw floor
-                    SURFACE_MAP.blit(
-                        ASSETS.S_FLOOR, (x * constants.CELL_WIDTH, y * constants.CELL_HEIGHT))
+    x1, y1 = max(x1, fov_x1), max(y1, fov_y1)
+    x2, y2 = min(x2, fov_x2), min(y2, fov_y2)
 
-            elif map_to_draw[x][y].explored:
+    for obj in GAME.current_objects.in_draw_order(x1, y1, x2, y2):
+        if FOV_VISIBLE[obj.x - fov_x1, obj.y - fov_y1]:
+            obj.draw()
 
-                if map_to_draw[x][y].block_path == True:
-                    SURFACE_MAP.blit(
-                        ASSETS.S_WALLEXPLORED, (x * constants.CELL_WIDTH, y * constants.CELL_HEIGHT))
-                else:
-                    SURFACE_MAP.blit(
-                        ASSETS.S_FLOOREXPLORED, (x * constants.CELL_WIDTH, y * constants.CELL_HEIGHT))
+    RENDER_QUEUE.draw(SURFACE_MAP)
 
 
 def draw_debug():
-    draw_text(SURFACE_MAIN, "fps: " + str(int(CLOCK.get_fps())), constants.FONT_DEBUG_MESSAGE,
-              (0, 0), constants.COLOR_WHITE, constants.COLOR_BLACK)
-
-
-def draw_messages():
+    fps_text = "fps: " + str(int(CLOCK.get_fps()))
 
-    if len(GAME.message_history) <= constants.NUM_MESSAGES:
-        to_draw = GAME.message_history
-    else:
-        to_draw = GAME.message_history[-constants.NUM_MESSAGES:]
-
-    text_height = helper_text_height(constants.FONT_MESSAGE_TEXT)
+    fps_rect = draw_text(SURFACE_MAIN, fps_text, constants.FONT_DEBUG_MESSAGE,
+                         (0, 0), constants.COLOR_WHITE, constants.COLOR_BLACK)
 
-    start_y = (constants.CAMERA_HEIGHT -
-               (constants.NUM_MESSAGES * text_height)) - 5
+    SCREEN_UPDATES.region("debug", fps_text, fps_rect)
 
-    i = 0
 
-    for message, color in to_draw:
+def draw_messages():
 
-        draw_text(SURFACE_MAIN, message, constants.FONT_MESSAGE_TEXT, (0, start_y +
-                                                                       (i * text_height)), color, constants.COLOR_BLACK)
+    MESSAGE_PANEL.update(GAME.message_history)
+    MESSAGE_PANEL.draw(SURFACE_MAIN)
 
-        i += 1
+    SCREEN_UPDATES.region("messages", MESSAGE_PANEL.redraws, MESSAGE_PANEL.rect)
 
 
 def draw_text(display_surface, text_to_display, font, T_coords, text_color, back_color=None, center=False):
@@ -1195,6 +2968,8 @@ def draw_text(display_surface, text_to_display, font, T_coords, text_color, back
 
     display_surface.blit(text_surf, text_rect)
 
+    return text_rect
+
 
 def draw_tile_rect(coords, tile_color=None, tile_alpha=None, mark=None):
 
@@ -1212,52 +2987,69 @@ def draw_tile_rect(coords, tile_color=None, tile_alpha=None, mark=None):
     else:
         local_alpha = 200
 
-    new_x = x * constants.CELL_WIDTH
-    new_y = y * constants.CELL_HEIGHT
+    SURFACE_MAP.blit(ASSETS.tile_overlay(local_color, local_alpha, mark),
+                     CAMERA.tile_to_cam((x, y)))
 
-    new_surface = pygame.Surface((constants.CELL_WIDTH, constants.CELL_HEIGHT))
 
-    new_surface.fill(local_color)
+##############################################################################
+# HELPER FUNCTIONS
+##############################################################################
 
-    new_surface.set_alpha(local_alpha)  # setting opacity
 
-    if mark:
-        draw_text(new_surface, mark, font=constants.FONT_CURSOR_TEXT, T_coords=(
-            constants.CELL_WIDTH/2, constants.CELL_HEIGHT/2), text_color=constants.COLOR_BLACK, center=True)
+def helper_rng(seed):
+    ''' A libtcod generator for the seed, or the global one (0) without '''
+    if seed is None:
+        return 0
 
-    SURFACE_MAP.blit(new_surface, (new_x, new_y))
+    return libtcodpy.random_new_from_seed(seed)
 
 
-##############################################################################
-# HELPER FUNCTIONS
-##############################################################################
+def helper_actor_state(actor):
+    ''' The parts of an actor that play can change, for level diffs '''
+    return (actor.x, actor.y, actor.depth, actor.animation_key, actor.state,
+            actor.creature.current_hp if actor.creature else None,
+            type(actor.ai) if actor.ai else None,
+            actor.equipment.equipped if actor.equipment else None)
 
 
-def helper_text_objects(incoming_text, incoming_font, incoming_color, incoming_bg):
-    if incoming_bg:
+def helper_idle_wait(animated=True):
+    ''' Sleeps until there is input to handle or, if animated, until an
+    animation on screen is due its next frame. Whatever woke it is put
+    back on the event queue for the loop to read '''
+    if constants.HEADLESS or not constants.GAME_IDLE_WAIT or pygame.event.peek():
+        return
 
-        Text_surface = incoming_font.render(
-            incoming_text, False, incoming_color, incoming_bg)
+    timeout = constants.GAME_IDLE_TIMEOUT
+
+    if animated and ANIMATION_CLOCK.next_frame_at is not None:
+        until_frame = math.ceil(ANIMATION_CLOCK.next_frame_at - pygame.time.get_ticks())
+
+        timeout = max(1, min(timeout, until_frame))
+
+    event = pygame.event.wait(timeout)
+
+    if event.type != pygame.NOEVENT:
+        pygame.event.post(event)
 
-    else:
-        Text_surface = incoming_font.render(
-            incoming_text, False, incoming_color)
+
+def helper_text_objects(incoming_text, incoming_font, incoming_color, incoming_bg):
+
+    Text_surface = TEXT_CACHE.render(
+        incoming_font, incoming_text, incoming_color, incoming_bg)
 
     return Text_surface, Text_surface.get_rect()
 
 
 def helper_text_height(font):
 
-    font_object = font.render('a', False, (0, 0, 0))
-    font_rect = font_object.get_rect()
-    return font_rect.height
+    font_width, font_height = TEXT_CACHE.font_size(font)
+    return font_height
 
 
 def helper_text_width(font):
 
-    font_object = font.render('a', False, (0, 0, 0))
-    font_rect = font_object.get_rect()
-    return font_rect.width
+    font_width, font_height = TEXT_CACHE.font_size(font)
+    return font_width
 
 
 ##############################################################################
@@ -1316,11 +3108,24 @@ def cast_fireball(caster, T_damage_radius_range):
         # Get sequence of tiles
         tiles_to_damage = map_find_radius(point_selected, local_radius)
 
+        # The creature on each tile of the blast, the oldest if several,
+        # found with one rect query instead of a lookup per tile
+        center_x, center_y = point_selected
+        level_objects = GAME.current_objects
+        creatures_in_blast = {}
+
+        for obj in level_objects.in_rect(center_x - local_radius, center_y - local_radius,
+                                         center_x + local_radius + 1, center_y + local_radius + 1):
+            other = creatures_in_blast.get((obj.x, obj.y))
+
+            if obj.creature and (other is None or level_objects.added[obj] < level_objects.added[other]):
+                creatures_in_blast[(obj.x, obj.y)] = obj
+
         creature_hit = False
 
         # Damage all creatures in tiles
         for (x, y) in tiles_to_damage:
-            creatures_to_damage = map_check_for_creatures(x, y)
+            creatures_to_damage = creatures_in_blast.get((x, y))
 
             if creatures_to_damage:
                 creatures_to_damage.creature.take_damage(damage)
@@ -1345,7 +3150,8 @@ def cast_confusion(caster, effect_length):
     # Temporarily confuse the target
         if target:
             oldai = target.ai
-            target.ai = ai_Confuse(old_ai=oldai, num_turns=effect_length)
+            GAME.current_objects.component_change(
+                target, "ai", ai_Confuse(old_ai=oldai, num_turns=effect_length))
             target.ai.owner = target
 
             game_message("The creature's eyes glaze over",
@@ -1533,6 +3339,7 @@ def menu_main():
 
         if options_button.update(game_input):
             menu_main_options()
+            SCREEN_UPDATES.add_all()
 
         if quit_button.update(game_input):
             pygame.quit()
@@ -1540,8 +3347,8 @@ def menu_main():
 
         SURFACE_MAIN.blit(ASSETS.MAIN_MENU_BG, (0, 0))
 
-        draw_text(SURFACE_MAIN, title_text, constants.FONT_TITLE_SCREEN,
-                  (title_x, title_y), constants.COLOR_RED, back_color=constants.COLOR_BLACK, center=True)
+        title_rect = draw_text(SURFACE_MAIN, title_text, constants.FONT_TITLE_SCREEN,
+                               (title_x, title_y), constants.COLOR_RED, back_color=constants.COLOR_BLACK, center=True)
 
         # Draw menu
         continue_game_button.draw()
@@ -1549,8 +3356,18 @@ def menu_main():
         options_button.draw()
         quit_button.draw()
 
+        # Only the buttons react to the mouse, the rest is static
+        SCREEN_UPDATES.add(title_rect)
+
+        for button in (continue_game_button, new_game_button, options_button, quit_button):
+            SCREEN_UPDATES.add(button.rect)
+
         # Update menu
-        pygame.display.update()
+        SCREEN_UPDATES.update()
+
+        CLOCK.tick(constants.GAME_FPS)
+
+        helper_idle_wait(animated=False)
 
 
 def menu_main_options():
@@ -1645,7 +3462,14 @@ def menu_main_options():
         music_effect_slider.draw()
         save_button.draw()
 
-        pygame.display.update()
+        SCREEN_UPDATES.add(settings_menu_rect)
+        SCREEN_UPDATES.update()
+
+        CLOCK.tick(constants.GAME_FPS)
+
+        # Closing goes straight back, without waiting on the next input
+        if not menu_close:
+            helper_idle_wait(animated=False)
 
 
 def menu_pause():
@@ -1672,12 +3496,20 @@ def menu_pause():
                 if event.key == pygame.K_p:
                     menu_close = True
 
-        draw_text(SURFACE_MAIN, menu_text, constants.FONT_DEBUG_MESSAGE, ((window_width /
-                                                                           2) - (text_width / 2), (window_height / 2) - (text_height / 2)), constants.COLOR_WHITE, constants.COLOR_BLACK)
+        text_rect = draw_text(SURFACE_MAIN, menu_text, constants.FONT_DEBUG_MESSAGE, ((window_width /
+                                                                                       2) - (text_width / 2), (window_height / 2) - (text_height / 2)), constants.COLOR_WHITE, constants.COLOR_BLACK)
+
+        SCREEN_UPDATES.region("pause", menu_text, text_rect)
 
         CLOCK.tick(constants.GAME_FPS)
 
-        pygame.display.flip()
+        SCREEN_UPDATES.update()
+
+        # Closing goes straight back, without waiting on the next input
+        if not menu_close:
+            helper_idle_wait(animated=False)
+
+    SCREEN_UPDATES.add_all()
 
 
 def menu_inventory():
@@ -1762,9 +3594,17 @@ def menu_inventory():
         SURFACE_MAIN.blit(local_inventory_surface,
                           (menu_x, menu_y))
 
+        SCREEN_UPDATES.add((menu_x, menu_y, menu_width, menu_height))
+
         CLOCK.tick(constants.GAME_FPS)
 
-        pygame.display.flip()
+        SCREEN_UPDATES.update()
+
+        # Closing goes straight back, without waiting on the next input
+        if not menu_close:
+            helper_idle_wait()
+
+    SCREEN_UPDATES.add_all()
 
 
 def menu_tile_select(coords_origin=None, max_range=None, penetrate_walls=True, pierce_creature=True, radius=None):
@@ -1775,6 +3615,8 @@ def menu_tile_select(coords_origin=None, max_range=None, penetrate_walls=True, p
     '''
     menu_close = False
 
+    last_selection_key = None
+
     while not menu_close:
 
         # Get mouse position
@@ -1789,29 +3631,30 @@ def menu_tile_select(coords_origin=None, max_range=None, penetrate_walls=True, p
         map_coord_x = math.floor(mapx_pixel/constants.CELL_WIDTH)
         map_coord_y = math.floor(mapy_pixel/constants.CELL_HEIGHT)
 
-        valid_tiles = []
+        # Nothing moves while targeting, so the tiles only change with the
+        # mouse's cell (or the map, should a spell have changed it)
+        selection_key = (coords_origin, (map_coord_x, map_coord_y),
+                         max_range, penetrate_walls, pierce_creature, radius,
+                         GAME.current_map.version, (CAMERA.x, CAMERA.y))
 
-        if coords_origin:
-            full_list_tiles = map_find_line(
-                coords_origin, (map_coord_x, map_coord_y))
+        if selection_key != last_selection_key:
+            last_selection_key = selection_key
 
-            for i, (x, y) in enumerate(full_list_tiles):
-                valid_tiles.append((x, y))
+            valid_tiles = map_find_target(coords_origin, (map_coord_x, map_coord_y),
+                                          max_range, penetrate_walls, pierce_creature)
 
-                # Stop at max range
-                if max_range and i == max_range - 1:
-                    break
+            area_effect = []
 
-                # Stop at wall
-                if not penetrate_walls and GAME.current_map[x][y].block_path:
-                    break
+            if radius:
+                area_effect = map_find_radius(valid_tiles[-1], radius)
 
-                # Stop at creature
-                if not pierce_creature and map_check_for_creatures(x, y):
-                    break
+            marked_tiles = tuple(valid_tiles + area_effect)
 
-        else:
-            valid_tiles = [(map_coord_x, map_coord_y)]
+            marked_rects = [pygame.Rect(CAMERA.tile_to_cam(coords),
+                                        (constants.CELL_WIDTH, constants.CELL_HEIGHT))
+                            for coords in marked_tiles]
+
+            marked_area = marked_rects[0].unionall(marked_rects)
 
         # Return map coords when presses left mouse-button
         for event in events_list:
@@ -1828,18 +3671,18 @@ def menu_tile_select(coords_origin=None, max_range=None, penetrate_walls=True, p
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
                     # Returns coord selected
+                    SCREEN_UPDATES.add_all()
                     return(valid_tiles[-1])
 
         # Draw game first
-        SURFACE_MAIN.fill(constants.COLOR_DEFAULT_BG)
-        SURFACE_MAP.fill(constants.COLOR_BLACK)
-
         CAMERA.update()
+        SCREEN_UPDATES.camera((CAMERA.x, CAMERA.y))
 
         draw_map(GAME.current_map)
 
-        for obj in GAME.current_objects:
-            obj.draw()
+        draw_objects()
+
+        SCREEN_UPDATES.actors_done()
 
         # Draw rectangle at mouse position on top of game
         for (tile_x, tile_y) in valid_tiles:
@@ -1849,24 +3692,29 @@ def menu_tile_select(coords_origin=None, max_range=None, penetrate_walls=True, p
             else:
                 draw_tile_rect(coords=(tile_x, tile_y))
 
-        if radius:
-            area_effect = map_find_radius(valid_tiles[-1], radius)
+        for (tile_x, tile_y) in area_effect:
+            draw_tile_rect(coords=(tile_x, tile_y),
+                           tile_color=constants.COLOR_RED, tile_alpha=150)
 
-            for (tile_x, tile_y) in area_effect:
-                draw_tile_rect(coords=(tile_x, tile_y),
-                               tile_color=constants.COLOR_RED, tile_alpha=150)
+        SCREEN_UPDATES.region("tile select", marked_tiles, marked_area)
 
-        SURFACE_MAIN.blit(SURFACE_MAP, (0, 0), CAMERA.rectangle)
+        SURFACE_MAIN.blit(SURFACE_MAP, (0, 0))
 
         draw_debug()
         draw_messages()
 
         # Update the display
-        pygame.display.flip()
+        SCREEN_UPDATES.update()
 
         # Tick the CLOCK
         CLOCK.tick(constants.GAME_FPS)
 
+        # Closing goes straight back, without waiting on the next input
+        if not menu_close:
+            helper_idle_wait()
+
+    SCREEN_UPDATES.add_all()
+
 
 ##############################################################################
 # GENERATORS
@@ -1927,30 +3775,30 @@ def gen_LAMP(coords):
 # ITEMS
 
 
-def gen_item(coords):
+def gen_item(coords, rng=0):
 
-    random_num = libtcodpy.random_get_int(0, 1, 5)
+    random_num = libtcodpy.random_get_int(rng, 1, 5)
 
     if random_num == 1:
-        new_item = gen_scroll_lightning(coords)
+        new_item = gen_scroll_lightning(coords, rng)
     elif random_num == 2:
-        new_item = gen_scroll_fireball(coords)
+        new_item = gen_scroll_fireball(coords, rng)
     elif random_num == 3:
-        new_item = gen_scroll_confusion(coords)
+        new_item = gen_scroll_confusion(coords, rng)
     elif random_num == 4:
-        new_item = gen_weapon_sword(coords)
+        new_item = gen_weapon_sword(coords, rng)
     elif random_num == 5:
-        new_item = gen_armor_shield(coords)
+        new_item = gen_armor_shield(coords, rng)
 
     GAME.current_objects.append(new_item)
 
 
-def gen_scroll_lightning(coords):
+def gen_scroll_lightning(coords, rng=0):
 
     x, y = coords
 
-    damage = libtcodpy.random_get_int(0, 5, 7)
-    m_range = libtcodpy.random_get_int(0, 7, 8)
+    damage = libtcodpy.random_get_int(rng, 5, 7)
+    m_range = libtcodpy.random_get_int(rng, 7, 8)
 
     item_com = com_Item(use_function=cast_lightning, value=(damage, m_range))
 
@@ -1960,13 +3808,13 @@ def gen_scroll_lightning(coords):
     return return_object
 
 
-def gen_scroll_fireball(coords):
+def gen_scroll_fireball(coords, rng=0):
 
     x, y = coords
 
-    damage = libtcodpy.random_get_int(0, 2, 4)
+    damage = libtcodpy.random_get_int(rng, 2, 4)
     radius = 1
-    m_range = libtcodpy.random_get_int(0, 9, 12)
+    m_range = libtcodpy.random_get_int(rng, 9, 12)
 
     item_com = com_Item(use_function=cast_fireball,
                         value=(damage, radius, m_range))
@@ -1977,11 +3825,11 @@ def gen_scroll_fireball(coords):
     return return_object
 
 
-def gen_scroll_confusion(coords):
+def gen_scroll_confusion(coords, rng=0):
 
     x, y = coords
 
-    effect_length = libtcodpy.random_get_int(0, 5, 10)
+    effect_length = libtcodpy.random_get_int(rng, 5, 10)
 
     item_com = com_Item(use_function=cast_confusion,
                         value=effect_length)
@@ -1992,11 +3840,11 @@ def gen_scroll_confusion(coords):
     return return_object
 
 
-def gen_weapon_sword(coords):
+def gen_weapon_sword(coords, rng=0):
 
     x, y = coords
 
-    bonus = libtcodpy.random_get_int(0, 1, 2)
+    bonus = libtcodpy.random_get_int(rng, 1, 2)
 
     equipment_com = com_Equipment(attack_bonus=bonus)
 
@@ -2006,11 +3854,11 @@ def gen_weapon_sword(coords):
     return return_object
 
 
-def gen_armor_shield(coords):
+def gen_armor_shield(coords, rng=0):
 
     x, y = coords
 
-    bonus = libtcodpy.random_get_int(0, 1, 2)
+    bonus = libtcodpy.random_get_int(rng, 1, 2)
 
     equipment_com = com_Equipment(defense_bonus=bonus)
 
@@ -2021,25 +3869,25 @@ def gen_armor_shield(coords):
 
 
 # ENEMIES
-def gen_enemy(coords):
-    random_num = libtcodpy.random_get_int(0, 1, 100)
+def gen_enemy(coords, rng=0):
+    random_num = libtcodpy.random_get_int(rng, 1, 100)
 
     if random_num <= 15:
-        new_enemy = gen_aquatic_squid(coords)
+        new_enemy = gen_aquatic_squid(coords, rng)
     elif random_num <= 70:
         new_enemy = gen_mouse(coords)
     else:
-        new_enemy = gen_aquatic_lobster(coords)
+        new_enemy = gen_aquatic_lobster(coords, rng)
 
     GAME.current_objects.append(new_enemy)
 
 
-def gen_aquatic_lobster(coords):
+def gen_aquatic_lobster(coords, rng=0):
 
     x, y = coords
 
-    max_health = libtcodpy.random_get_int(0, 5, 10)
-    base_attack = libtcodpy.random_get_int(0, 1, 3)
+    max_health = libtcodpy.random_get_int(rng, 5, 10)
+    base_attack = libtcodpy.random_get_int(rng, 1, 3)
 
     item_com = com_Item(use_function=cast_heal, value=4)
     creature_com = com_Creature(
@@ -2050,12 +3898,12 @@ def gen_aquatic_lobster(coords):
     return enemy
 
 
-def gen_aquatic_squid(coords):
+def gen_aquatic_squid(coords, rng=0):
 
     x, y = coords
 
-    max_health = libtcodpy.random_get_int(0, 12, 15)
-    base_attack = libtcodpy.random_get_int(0, 3, 6)
+    max_health = libtcodpy.random_get_int(rng, 12, 15)
+    base_attack = libtcodpy.random_get_int(rng, 3, 6)
 
     item_com = com_Item(use_function=cast_heal, value=5)
     creature_com = com_Creature(
@@ -2094,49 +3942,86 @@ def gen_mouse(coords):
 ##############################################################################
 
 
-def game_main_loop():
-    '''In this function we loop the main game'''
+def game_main_loop(input_turns=None):
+    '''In this function we loop the main game.
+    input_turns, if given, stands in for the keyboard: a list of events
+    per turn, and the loop ends when it runs out. Returns the turns played'''
     game_quit = False
 
     # player action definition
     player_action = "no-action"
 
+    turns_played = 0
+
+    if input_turns is not None:
+        input_turns = iter(input_turns)
+
     while not game_quit:
 
+        event_list = None
+
+        if input_turns is not None:
+            event_list = next(input_turns, None)
+
+            if event_list is None:
+                break
+
         # handle player input
-        player_action = game_handle_keys()
+        player_action = game_handle_keys(event_list)
 
         map_calculate_fov()
 
+        map_update_chunks()
+
         if player_action == "QUIT":
             game_exit()
 
-        for obj in GAME.current_objects:
-            if obj.ai:
-                if player_action != "no-action":
+        if player_action != "no-action":
+            for obj in GAME.current_objects.having("ai"):
+                # Could have died to an earlier turn this time round
+                if obj.ai:
                     obj.ai.take_turn()
-            if obj.exitportal:
-                obj.exitportal.update()
+
+        for obj in GAME.current_objects.having("exitportal"):
+            obj.exitportal.update()
+
+        if player_action != "no-action":
+            turns_played += 1
 
         if (PLAYER.state == "STATUS_DEAD" or PLAYER.state == "STATUS_WIN"):
             game_quit = True
 
+        # Headless runs as fast as the game logic goes
+        if constants.HEADLESS:
+            continue
+
         # draw the game
         draw_game()
 
         # update the game
-        pygame.display.flip()
+        SCREEN_UPDATES.update()
 
         # tick the CLOCK
         CLOCK.tick(constants.GAME_FPS)
 
+        # Turn-based: nothing changes until a key is pressed or a sprite
+        # flickers. A death or a win ends the loop without waiting
+        if not game_quit:
+            helper_idle_wait()
+
+    GAME.levels.close()
+    LEVEL_PREFETCHER.shutdown()
+
+    return turns_played
+
 
 def game_initialize():
     '''This function initializes the main window, and pygame'''
 
-    global SURFACE_MAIN, SURFACE_MAP
+    global SURFACE_MAIN, SURFACE_MAP, TERRAIN, SCREEN_UPDATES, RENDER_QUEUE
+    global TEXT_CACHE, MESSAGE_PANEL, ANIMATION_CLOCK
     global CLOCK, FOV_CALCULATE, ASSETS, CAMERA, RANDOM_ENGINE
-    global PREFERENCES
+    global PREFERENCES, LEVEL_PREFETCHER
     # initialize pygame
     pygame.init()
 
@@ -2153,26 +4038,44 @@ def game_initialize():
     SURFACE_MAIN = pygame.display.set_mode(
         (constants.CAMERA_WIDTH, constants.CAMERA_HEIGHT))
 
+    # Only the camera's view is rendered, whatever the size of the map
     SURFACE_MAP = pygame.Surface(
-        (constants.MAP_WIDTH * constants.CELL_WIDTH, constants.MAP_HEIGHT * constants.CELL_HEIGHT))
+        (constants.CAMERA_WIDTH, constants.CAMERA_HEIGHT))
 
     CAMERA = obj_Camera()
 
+    TEXT_CACHE = obj_TextCache()
+
     ASSETS = obj_Assets()
 
+    TERRAIN = obj_TerrainLayer()
+
+    RENDER_QUEUE = obj_RenderQueue(ASSETS.atlas, TERRAIN.width * TERRAIN.height)
+
+    MESSAGE_PANEL = obj_MessagePanel()
+
+    ANIMATION_CLOCK = obj_AnimationClock()
+
+    SCREEN_UPDATES = obj_ScreenUpdates()
+
     CLOCK = pygame.time.Clock()
 
     # Random Number Engine
     RANDOM_ENGINE = random.SystemRandom()
 
+    # Background level generation
+    LEVEL_PREFETCHER = obj_LevelPrefetcher()
+
     FOV_CALCULATE = True
 
 
-def game_handle_keys():
+def game_handle_keys(event_list=None):
     global FOV_CALCULATE
     # get player input
     keys_list = pygame.key.get_pressed()
-    event_list = pygame.event.get()
+
+    if event_list is None:
+        event_list = pygame.event.get()
 
     # Check for mod key
     MOD_KEY = (keys_list[pygame.K_RSHIFT] or keys_list[pygame.K_LSHIFT])
@@ -2228,7 +4131,7 @@ def game_handle_keys():
             if event.key == pygame.K_c:
                 cast_confusion()
 
-            if MOD_KEY and event.key == pygame.K_PERIOD:
+            if (MOD_KEY or event.mod & pygame.KMOD_SHIFT) and event.key == pygame.K_PERIOD:
                 list_of_objects = map_objects_at_coords(PLAYER.x, PLAYER.y)
                 for obj in list_of_objects:
                     if obj.stairs:
@@ -2251,13 +4154,63 @@ def game_new():
 
     gen_player((0, 0))
 
-    map_place_objects(GAME.current_rooms)
+    map_place_objects(GAME.current_rooms, GAME.objects_seed(GAME.depth))
+
+    GAME.prefetch_next()
+
+
+def game_headless(num_turns=1000, seed=None):
+    ''' Plays num_turns of random keys without drawing anything, and
+    reports how many turns a second the game logic manages '''
+    global RANDOM_ENGINE
+
+    game_initialize()
+
+    if seed is not None:
+        RANDOM_ENGINE = random.Random(seed)
+
+    game_new()
+
+    start = time.perf_counter()
+
+    turns_played = game_main_loop(game_random_input(
+        random.Random(seed), num_turns))
+
+    elapsed = time.perf_counter() - start
+
+    print("{} turns in {:.2f}s: {:.0f} turns/s, depth {}, {}".format(
+        turns_played, elapsed, turns_played / elapsed, GAME.depth,
+        PLAYER.state or "alive"))
+
+    return turns_played / elapsed
+
+
+def game_random_input(rng, num_turns):
+    ''' Key presses for game_main_loop: walking, picking up and dropping
+    items, and taking any stairs stood on '''
+    walk_keys = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
+
+    for i in range(num_turns):
+        turn_events = [pygame.event.Event(
+            pygame.KEYDOWN, key=rng.choice(walk_keys), mod=pygame.KMOD_NONE)]
+
+        other_key = rng.choice([pygame.K_g, pygame.K_d, pygame.K_PERIOD, None])
+
+        if other_key:
+            # Ahead of the walk, so it acts on the tile the player is on
+            turn_events.insert(0, pygame.event.Event(
+                pygame.KEYDOWN, key=other_key, mod=pygame.KMOD_SHIFT))
+
+        yield turn_events
 
 
 def game_exit():
 
     game_save()
 
+    GAME.levels.close()
+    LEVEL_PREFETCHER.shutdown()
+
     # Quit the game
     pygame.quit()
     sys.exit()
@@ -2283,6 +4236,8 @@ def game_load():
 
     map_make_fov(GAME.current_map)
 
+    GAME.prefetch_next()
+
 
 def game_continue():
 
@@ -2308,4 +4263,7 @@ def preferences_load():
 
 
 if __name__ == '__main__':
-    menu_main()
+    if constants.HEADLESS:
+        game_headless()
+    else:
+        menu_main()